@@ -1,17 +1,42 @@
+import os
 import tkinter as tk
 from tkinter import messagebox
 
+from board import Board, PLAYERS
+from lattice import LatticeView
+from solver import Solver, SolvedTable, TABLE_FILE
+
+# Cells per side of the cube: 3 is the classic game, 4 is Qubic (76 winning lines).
+BOARD_SIZE = 3
+# Side played by the solver: None for two players, or "X"/"O" to play against it. Run
+# "python solver.py build" once to write the table that turns its moves into lookups; without
+# it each move is searched.
+AI_PLAYER = None
+AI_DELAY_MS = 300
+# Plies the AI looks ahead; None plays perfectly, which is only quick on the 3x3x3 board.
+AI_DEPTH = None if BOARD_SIZE == 3 else 3
+
 class TicTacToe3D:
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("3D Tic-Tac-Toe with Lattice Visualizer")
-        self.tabuleiro = [[[None for _ in range(3)] for _ in range(3)] for _ in range(3)]
-        self.turn = "X"
+        self.size = BOARD_SIZE
+        self.tabuleiro = [[[None for _ in range(self.size)] for _ in range(self.size)] for _ in range(self.size)]
+        self.board = Board(self.size)
         self.score = {"X": 0, "O": 0, "Ties": 0}
-        self.moves = 0
+        self.solver = None
+        if AI_PLAYER is not None:
+            table = None
+            if AI_DEPTH is None and os.path.exists(TABLE_FILE):
+                try:
+                    table = SolvedTable(TABLE_FILE, self.size)
+                except ValueError:
+                    pass  # built for another board size
+            self.solver = Solver(self.size, table, AI_DEPTH)
 
         self.setup_ui()
         self.update_score()
+        self.schedule_ai()
 
     def setup_ui(self):
         self.frame_score = tk.Frame(self.root)
@@ -25,15 +50,19 @@ class TicTacToe3D:
         self.board_frame = tk.Frame(self.root)
         self.board_frame.pack(side="left", padx=100)
 
+        # At most three layers side by side; the buttons shrink as the board grows.
+        font_size = max(8, 60 // self.size)
+        width = max(2, 12 // self.size)
+        height = 2 if self.size <= 3 else 1
         self.frames_board = []
-        for layer in range(3):
+        for layer in range(self.size):
             frame = tk.LabelFrame(self.board_frame, text=f"Layer {layer + 1}", padx=5, pady=5)
-            frame.grid(row=0, column=layer, padx=5)
+            frame.grid(row=layer // 3, column=layer % 3, padx=5, pady=5)
             self.frames_board.append(frame)
-            for row in range(3):
-                for col in range(3):
+            for row in range(self.size):
+                for col in range(self.size):
                     button = tk.Button(
-                        frame, text="", font=("Arial", 20), width=4, height=2,
+                        frame, text="", font=("Arial", font_size), width=width, height=height,
                         command=lambda l=layer, r=row, c=col: self.play(l, r, c)
                     )
                     button.grid(row=row, column=col)
@@ -41,6 +70,7 @@ class TicTacToe3D:
 
         self.visualizer = tk.Canvas(self.root, width=500, height=500, bg="white")
         self.visualizer.pack(side="right", padx=10)
+        self.lattice = LatticeView(self.visualizer, self.board.geometry)
 
         self.reset_button = tk.Button(
             self.root, text="Restart Game", command=self.restart_game, font=("Arial", 12)
@@ -52,109 +82,61 @@ class TicTacToe3D:
             text=f"Score: X {self.score['X']} vs O {self.score['O']} | Ties: {self.score['Ties']}"
         )
 
+    @property
+    def turn(self):
+        return PLAYERS[self.board.turn]
+
     def play(self, layer, row, col):
-        button = self.tabuleiro[layer][row][col]
-        if button["text"] == "":
-            button.config(text=self.turn)
-            self.moves += 1
-            self.update_visualizer()
-
-            if self.check_winner():
-                self.score[self.turn] += 1
-                self.end_game(f"Congratulations! Player ({self.turn}) wins!")
-                return
-
-            if self.moves == 27:
-                self.score["Ties"] += 1
-                self.end_game("It's a tie! No one wins.")
-                return
-
-            self.turn = "O" if self.turn == "X" else "X"
+        if self.turn == AI_PLAYER:
+            return
+        cell = self.board.geometry.cell_index(layer, row, col)
+        if self.board.piece_at(cell) is None:
+            self.make_move(cell)
+            self.schedule_ai()
         else:
             messagebox.showwarning("Invalid Move", "This cell is already occupied!")
 
-    def update_visualizer(self):
-        self.visualizer.delete("all")
-        size = 50
-        gap = 150
-        offset_x = 100
-        offset_y = 100
-
-        for z in range(3):
-            for y in range(3):
-                for x in range(3):
-                    cx = offset_x + x * gap + z * 10
-                    cy = offset_y + y * gap - z * 10
-                    self.visualizer.create_oval(cx - 5, cy - 5, cx + 5, cy + 5, fill="gray")
-                    cell = self.tabuleiro[z][y][x].cget("text")
-                    if cell:
-                        color = "black" if cell == "X" else "red"
-                        self.visualizer.create_text(cx, cy - 10, text=cell, font=("Arial", 16), fill=color)
-
-        for z in range(3):
-            for y in range(3):
-                for x in range(3):
-                    start = self._coords(x, y, z, offset_x, offset_y, gap)
-                    if x < 2:
-                        end = self._coords(x+1, y, z, offset_x, offset_y, gap)
-                        self.visualizer.create_line(*start, *end, fill="lightgray")
-                    if y < 2:
-                        end = self._coords(x, y+1, z, offset_x, offset_y, gap)
-                        self.visualizer.create_line(*start, *end, fill="lightgray")
-                    if z < 2:
-                        end = self._coords(x, y, z+1, offset_x, offset_y, gap)
-                        self.visualizer.create_line(*start, *end, fill="lightgray")
-
-    def _coords(self, x, y, z, offset_x, offset_y, gap):
-        cx = offset_x + x * gap + z * 10
-        cy = offset_y + y * gap - z * 10
-        return (cx, cy)
-
-    def check_winner(self):
-        for layer in range(3):
-            for row in range(3):
-                if all(self.tabuleiro[layer][row][col].cget("text") == self.turn for col in range(3)):
-                    return True
-            for col in range(3):
-                if all(self.tabuleiro[layer][row][col].cget("text") == self.turn for row in range(3)):
-                    return True
-            if all(self.tabuleiro[layer][i][i].cget("text") == self.turn for i in range(3)):
-                return True
-            if all(self.tabuleiro[layer][i][2 - i].cget("text") == self.turn for i in range(3)):
-                return True
-
-        for row in range(3):
-            for col in range(3):
-                if all(self.tabuleiro[layer][row][col].cget("text") == self.turn for layer in range(3)):
-                    return True
-
-        if all(self.tabuleiro[i][i][i].cget("text") == self.turn for i in range(3)):
-            return True
-        if all(self.tabuleiro[i][i][2 - i].cget("text") == self.turn for i in range(3)):
-            return True
-        if all(self.tabuleiro[i][2 - i][i].cget("text") == self.turn for i in range(3)):
-            return True
-        if all(self.tabuleiro[i][2 - i][2 - i].cget("text") == self.turn for i in range(3)):
-            return True
-
-        return False
+    def make_move(self, cell):
+        layer, row, col = self.board.geometry.cell_coords(cell)
+        player = self.turn
+        won = self.board.play(cell)
+        self.tabuleiro[layer][row][col].config(text=player)
+        self.lattice.set_piece(cell, player)
+
+        if won:
+            self.score[player] += 1
+            self.end_game(f"Congratulations! Player ({player}) wins!")
+            return
+
+        if self.board.is_full():
+            self.score["Ties"] += 1
+            self.end_game("It's a tie! No one wins.")
+
+    def schedule_ai(self):
+        if self.solver is not None and self.turn == AI_PLAYER and not self.board.is_over():
+            self.root.after(AI_DELAY_MS, self.ai_move)
+
+    def ai_move(self):
+        # The board may have been reset while the move was scheduled.
+        if self.turn == AI_PLAYER and not self.board.is_over():
+            self.make_move(self.solver.best_move(self.board))
 
     def end_game(self, message):
         self.update_score()
-        for layer in range(3):
-            for row in range(3):
-                for col in range(3):
-                    self.tabuleiro[layer][row][col].config(state="disabled")
+        for layer in self.tabuleiro:
+            for row in layer:
+                for button in row:
+                    button.config(state="disabled")
         messagebox.showinfo("Game Over", message)
 
     def restart_game(self):
-        self.turn = "X"
-        self.moves = 0
-        for layer in range(3):
-            for row in range(3):
-                for col in range(3):
-                    self.tabuleiro[layer][row][col].config(text="", state="normal")
-        self.update_visualizer()
+        self.board = Board(self.size)
+        for layer in self.tabuleiro:
+            for row in layer:
+                for button in row:
+                    button.config(text="", state="normal")
+        self.lattice.clear()
+        self.schedule_ai()
 
     def start(self):
         self.root.mainloop()
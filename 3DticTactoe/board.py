@@ -0,0 +1,140 @@
+PLAYERS = ("X", "O")
+DEFAULT_SIZE = 3
+
+
+class Geometry:
+    """Cell numbering and winning lines of an N x N x N cube.
+
+    Built once per size by geometry(); boards of the same size share it.
+    There are ((N + 2) ** 3 - N ** 3) / 2 lines: 49 for N = 3, 76 for N = 4.
+    """
+
+    def __init__(self, size):
+        if size < 2:
+            raise ValueError(f"board size must be at least 2, not {size}")
+        self.size = size
+        self.cells = size ** 3
+        self.lines = self._win_lines()
+        self.line_masks = [sum(1 << cell for cell in line) for line in self.lines]
+        # Indices into lines of the lines through each cell.
+        self.cell_lines = [[] for _ in range(self.cells)]
+        for number, line in enumerate(self.lines):
+            for cell in line:
+                self.cell_lines[cell].append(number)
+        self.full_mask = (1 << self.cells) - 1
+
+    def cell_index(self, layer, row, col):
+        return (layer * self.size + row) * self.size + col
+
+    def cell_coords(self, index):
+        # (layer, row, col) of a cell index.
+        layer, rest = divmod(index, self.size * self.size)
+        return (layer,) + divmod(rest, self.size)
+
+    def _win_lines(self):
+        # Every straight line of N cells through the cube: rows, columns and
+        # pillars, the diagonals of all 3 * N axis-aligned planes, and the 4
+        # space diagonals. Each line is found once, from the end where
+        # stepping back would leave the cube.
+        size = self.size
+        directions = [(dl, dr, dc) for dl in (-1, 0, 1) for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+                      if (dl, dr, dc) > (0, 0, 0)]
+        inside = range(size)
+        lines = []
+        for dl, dr, dc in directions:
+            for index in range(self.cells):
+                layer, row, col = self.cell_coords(index)
+                if layer - dl in inside and row - dr in inside and col - dc in inside:
+                    continue
+                end = (layer + (size - 1) * dl, row + (size - 1) * dr, col + (size - 1) * dc)
+                if all(coord in inside for coord in end):
+                    lines.append(tuple(self.cell_index(layer + i * dl, row + i * dr, col + i * dc)
+                                       for i in range(size)))
+        return lines
+
+
+_geometries = {}
+
+
+def geometry(size=DEFAULT_SIZE):
+    if size not in _geometries:
+        _geometries[size] = Geometry(size)
+    return _geometries[size]
+
+
+class Board:
+    """Game state of 3D tic-tac-toe without any widgets.
+
+    Each player's cells are one int with bit cell_index(layer, row, col)
+    set. counts[player][line] is how many cells of that line the player
+    holds, kept up to date by play() and undo(), so a move only looks at
+    the lines through its own cell whatever the size of the cube.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.geometry = geometry(size)
+        self.size = size
+        self.cells = self.geometry.cells
+        self.masks = [0, 0]
+        lines = len(self.geometry.lines)
+        self.counts = [[0] * lines, [0] * lines]
+        self.turn = 0  # index into PLAYERS
+        self.moves = []
+        self.winner = None
+        self.winning_line = None
+
+    @property
+    def occupied(self):
+        return self.masks[0] | self.masks[1]
+
+    def piece_at(self, cell):
+        # "X", "O" or None.
+        bit = 1 << cell
+        if self.masks[0] & bit:
+            return PLAYERS[0]
+        if self.masks[1] & bit:
+            return PLAYERS[1]
+        return None
+
+    def empty_cells(self):
+        free = ~self.occupied
+        return [cell for cell in range(self.cells) if free >> cell & 1]
+
+    def is_full(self):
+        return len(self.moves) == self.cells
+
+    def is_over(self):
+        return self.winner is not None or self.is_full()
+
+    def play(self, cell):
+        # Returns True if the move wins.
+        if self.occupied >> cell & 1:
+            raise ValueError(f"cell {cell} is already occupied")
+        if self.is_over():
+            raise ValueError("the game is over")
+        player = self.turn
+        self.masks[player] |= 1 << cell
+        counts = self.counts[player]
+        for line in self.geometry.cell_lines[cell]:
+            counts[line] += 1
+            if counts[line] == self.size:
+                self.winner = player
+                self.winning_line = self.geometry.lines[line]
+        self.moves.append(cell)
+        if self.winner is None:
+            self.turn ^= 1
+        return self.winner is not None
+
+    def undo(self):
+        # Takes back the last move and returns its cell.
+        cell = self.moves.pop()
+        if self.winner is None:
+            self.turn ^= 1
+        player = self.turn
+        self.masks[player] &= ~(1 << cell)
+        counts = self.counts[player]
+        for line in self.geometry.cell_lines[cell]:
+            counts[line] -= 1
+        self.winner = None
+        self.winning_line = None
+        return cell
@@ -0,0 +1,145 @@
+import math
+
+import numpy as np
+
+# Perspective view of the board's lattice on a Tk canvas. Drag with the left
+# mouse button to rotate it and use the wheel to zoom.
+
+CAMERA_DISTANCE = 4.0  # in half cube widths from the centre
+SCALE = 150  # pixels per half cube width at zoom 1
+DOT_RADIUS = 5
+DRAG_SPEED = 0.01  # radians per pixel
+RESTACK_ANGLE = 0.05  # radians of rotation before the stacking order is redone mid-drag
+ZOOM_STEP = 1.1
+MIN_ZOOM, MAX_ZOOM = 0.4, 3.0
+PIECE_COLORS = {"X": "black", "O": "red"}
+
+
+class LatticeView:
+    """The cells of a Geometry as dots joined by their edges, plus piece labels.
+
+    Canvas items are created once and only ever moved with coords(). A
+    redraw projects every lattice point with one matrix multiply and moves
+    the items. Dots and labels are restacked from back to front only once
+    the view has turned RESTACK_ANGLE since the last sort (and when a drag
+    ends), and only if the depth order changed; in between, only items at
+    nearly equal depth can be out of order. Mouse motion just schedules a
+    redraw, so a burst of drag events costs one frame.
+    """
+
+    def __init__(self, canvas, geometry, yaw=0.5, pitch=0.35, zoom=1.0):
+        self.canvas = canvas
+        self.geometry = geometry
+        self.yaw = yaw
+        self.pitch = pitch
+        self.zoom = zoom
+
+        # Cell positions with the cube centred on the origin and spanning -1..1.
+        coords = np.array([geometry.cell_coords(cell) for cell in range(geometry.cells)], dtype=float)
+        layer, row, col = coords.T
+        self.points = np.stack([col, row, layer], axis=1) * (2 / (geometry.size - 1)) - 1
+
+        edges = []
+        for cell in range(geometry.cells):
+            layer, row, col = geometry.cell_coords(cell)
+            for d_layer, d_row, d_col in ((0, 0, 1), (0, 1, 0), (1, 0, 0)):
+                if max(layer + d_layer, row + d_row, col + d_col) < geometry.size:
+                    edges.append((cell, geometry.cell_index(layer + d_layer, row + d_row, col + d_col)))
+        self.edge_ends = np.array(edges).T
+
+        self.edge_items = [canvas.create_line(0, 0, 0, 0, fill="lightgray") for _ in edges]
+        self.dot_items = []
+        self.piece_items = []
+        for cell in range(geometry.cells):
+            self.dot_items.append(canvas.create_oval(0, 0, 0, 0, fill="gray"))
+            self.piece_items.append(canvas.create_text(0, 0, text="", font=("Arial", 16), tags="piece"))
+        self._order = None
+        self._sorted_view = None
+        self._pending = None
+        self._drag = None
+
+        canvas.bind("<ButtonPress-1>", self._start_drag)
+        canvas.bind("<B1-Motion>", self._on_drag)
+        canvas.bind("<ButtonRelease-1>", self._end_drag)
+        canvas.bind("<MouseWheel>", lambda event: self._zoom_by(ZOOM_STEP if event.delta > 0 else 1 / ZOOM_STEP))
+        canvas.bind("<Button-4>", lambda event: self._zoom_by(ZOOM_STEP))  # X11 wheel
+        canvas.bind("<Button-5>", lambda event: self._zoom_by(1 / ZOOM_STEP))
+        self.redraw()
+
+    def set_piece(self, cell, player):
+        self.canvas.itemconfig(self.piece_items[cell], text=player, fill=PIECE_COLORS[player])
+
+    def clear(self):
+        self.canvas.itemconfig("piece", text="")
+
+    def rotation(self):
+        cos_yaw, sin_yaw = math.cos(self.yaw), math.sin(self.yaw)
+        cos_pitch, sin_pitch = math.cos(self.pitch), math.sin(self.pitch)
+        around_y = np.array([[cos_yaw, 0, sin_yaw], [0, 1, 0], [-sin_yaw, 0, cos_yaw]])
+        around_x = np.array([[1, 0, 0], [0, cos_pitch, -sin_pitch], [0, sin_pitch, cos_pitch]])
+        return around_x @ around_y
+
+    def project(self):
+        # Screen x, screen y and perspective factor of every cell, and its
+        # depth (larger is farther away).
+        rotated = self.points @ self.rotation().T
+        depth = rotated[:, 2]
+        factor = CAMERA_DISTANCE / (CAMERA_DISTANCE + depth)
+        scale = SCALE * self.zoom * factor
+        center_x = int(self.canvas.cget("width")) / 2
+        center_y = int(self.canvas.cget("height")) / 2
+        return center_x + rotated[:, 0] * scale, center_y + rotated[:, 1] * scale, factor, depth
+
+    def redraw(self, restack=False):
+        self._pending = None
+        x, y, factor, depth = self.project()
+        canvas = self.canvas
+
+        start, end = self.edge_ends
+        for item, line in zip(self.edge_items, np.stack([x[start], y[start], x[end], y[end]], axis=1).tolist()):
+            canvas.coords(item, *line)
+
+        radius = DOT_RADIUS * factor
+        dots = np.stack([x - radius, y - radius, x + radius, y + radius], axis=1).tolist()
+        labels = np.stack([x, y - 2 * radius], axis=1).tolist()
+        for cell in range(self.geometry.cells):
+            canvas.coords(self.dot_items[cell], *dots[cell])
+            canvas.coords(self.piece_items[cell], *labels[cell])
+
+        if self._sorted_view is not None and not restack:
+            turned = abs(self.yaw - self._sorted_view[0]) + abs(self.pitch - self._sorted_view[1])
+            if turned < RESTACK_ANGLE:
+                return
+        self._sorted_view = (self.yaw, self.pitch)
+        order = np.argsort(-depth, kind="stable")
+        if self._order is None or not np.array_equal(order, self._order):
+            for cell in order.tolist():
+                canvas.tag_raise(self.dot_items[cell])
+                canvas.tag_raise(self.piece_items[cell])
+            self._order = order
+
+    def schedule_redraw(self):
+        if self._pending is None:
+            self._pending = self.canvas.after_idle(self.redraw)
+
+    def _start_drag(self, event):
+        self._drag = (event.x, event.y)
+
+    def _on_drag(self, event):
+        if self._drag is None:
+            self._drag = (event.x, event.y)
+        dx, dy = event.x - self._drag[0], event.y - self._drag[1]
+        self._drag = (event.x, event.y)
+        self.yaw -= dx * DRAG_SPEED
+        self.pitch = max(-math.pi / 2, min(math.pi / 2, self.pitch + dy * DRAG_SPEED))
+        self.schedule_redraw()
+
+    def _end_drag(self, event):
+        self._drag = None
+        if self._pending is not None:
+            self.canvas.after_cancel(self._pending)
+        self.redraw(restack=True)
+
+    def _zoom_by(self, factor):
+        self.zoom = max(MIN_ZOOM, min(MAX_ZOOM, self.zoom * factor))
+        self.schedule_redraw()
@@ -0,0 +1,208 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from board import Board, DEFAULT_SIZE, geometry
+from solver import Solver, SolvedTable, TABLE_FILE
+
+# Plays many games of 3D tic-tac-toe at once without a window, for comparing
+# AI players. Example:
+#
+#   python simulate.py                          # every matchup, 3x3x3
+#   python simulate.py --size 4 --games 20000 --players random heuristic
+#
+# Player X moves first.
+
+EMPTY, X, O = 0, 1, 2
+
+
+class GameBatch:
+    """*count* games played in lockstep as NumPy arrays.
+
+    cells[game, cell] is EMPTY, X or O, and counts[game, player, line] is how
+    many cells of each line a player holds (player 0 is X). All games are on
+    the same ply, so they share whose turn it is; finished games just stop
+    taking moves.
+    """
+
+    def __init__(self, count, size=DEFAULT_SIZE):
+        self.geometry = geometry(size)
+        self.size = size
+        self.count = count
+        cells, lines = self.geometry.cells, len(self.geometry.lines)
+        # incidence[cell, line] is 1 if the line goes through the cell.
+        self.incidence = np.zeros((cells, lines), dtype=np.int8)
+        for number, line in enumerate(self.geometry.lines):
+            self.incidence[list(line), number] = 1
+        self.cells = np.zeros((count, cells), dtype=np.int8)
+        self.counts = np.zeros((count, 2, lines), dtype=np.int8)
+        self.history = np.zeros((count, cells), dtype=np.int16)
+        self.ply = 0
+        self.winner = np.full(count, -1, dtype=np.int8)  # player index, or -1
+        self.active = np.ones(count, dtype=bool)
+
+    @property
+    def turn(self):
+        return self.ply % 2
+
+    def empty(self):
+        return self.cells == EMPTY
+
+    def play(self, moves):
+        # Applies moves[game] for every active game; other entries are ignored.
+        games = np.flatnonzero(self.active)
+        cells = moves[games]
+        if (self.cells[games, cells] != EMPTY).any():
+            raise ValueError("move to an occupied cell")
+        player = self.turn
+        self.cells[games, cells] = player + 1
+        self.history[games, self.ply] = cells
+        counts = self.counts[games, player] + self.incidence[cells]
+        self.counts[games, player] = counts
+        won = (counts == self.size).any(axis=1)
+        self.winner[games[won]] = player
+        self.ply += 1
+        self.active[games[won]] = False
+        if self.ply == self.geometry.cells:
+            self.active[:] = False
+
+    def run(self, players):
+        # Plays every game to the end with players[0] as X and players[1] as O.
+        while self.active.any():
+            self.play(players[self.turn](self))
+        return self.results()
+
+    def results(self):
+        # (X wins, O wins, draws)
+        return (int((self.winner == 0).sum()), int((self.winner == 1).sum()),
+                int((self.winner == -1).sum()))
+
+
+class RandomPlayer:
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, batch):
+        scores = self.rng.random(batch.cells.shape)
+        scores[~batch.empty()] = -1
+        return scores.argmax(axis=1)
+
+
+class HeuristicPlayer:
+    """Wins if it can, blocks if it must, and otherwise takes the cell on
+    the most valuable open lines, all as array operations over the batch."""
+
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, batch):
+        me, them = batch.turn, batch.turn ^ 1
+        mine = batch.counts[:, me].astype(np.int32)
+        theirs = batch.counts[:, them].astype(np.int32)
+        incidence = batch.incidence.T.astype(np.int32)
+        open_mine = theirs == 0
+        open_theirs = mine == 0
+        weight = np.where(open_mine, (mine + 1) ** 2, 0) + np.where(open_theirs, theirs ** 2, 0)
+        # Finishing a line outweighs any number of other lines, blocking
+        # one outweighs everything but a win.
+        big = weight.shape[1] * (batch.size + 1) ** 2 + 1
+        weight += np.where(open_mine & (mine == batch.size - 1), big * big, 0)
+        weight += np.where(open_theirs & (theirs == batch.size - 1), big, 0)
+        scores = (weight @ incidence).astype(float)
+        scores += self.rng.random(scores.shape)  # random tie-break
+        scores[~batch.empty()] = -1
+        return scores.argmax(axis=1)
+
+
+class SolverPlayer:
+    """solver.Solver for each game in turn; only the bookkeeping is batched.
+
+    Each game keeps a Board that catches up on the moves since this player
+    last moved from the batch history. The boards belong to the batch being
+    played and are replaced when a new batch comes along.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, max_depth=None, table=None):
+        self.solver = Solver(size, table, max_depth)
+        self.size = size
+        self.batch = None  # held so the boards can't outlive their batch
+        self.boards = []
+
+    def __call__(self, batch):
+        if batch is not self.batch:
+            self.batch = batch
+            self.boards = [Board(self.size) for _ in range(batch.count)]
+        moves = np.zeros(batch.count, dtype=np.int64)
+        for game in np.flatnonzero(batch.active).tolist():
+            board = self.boards[game]
+            for cell in batch.history[game, len(board.moves):batch.ply].tolist():
+                board.play(cell)
+            moves[game] = self.solver.best_move(board)
+        return moves
+
+
+def play_one_by_one(count, size, seed=0):
+    # The same random games on Board objects, one game at a time, as a baseline.
+    rng = np.random.default_rng(seed)
+    results = [0, 0, 0]
+    for _ in range(count):
+        board = Board(size)
+        while not board.is_over():
+            empty = board.empty_cells()
+            board.play(empty[rng.integers(len(empty))])
+        results[2 if board.winner is None else board.winner] += 1
+    return tuple(results)
+
+
+def make_player(name, size, seed, depth, table):
+    if name == "random":
+        return RandomPlayer(seed)
+    if name == "heuristic":
+        return HeuristicPlayer(seed)
+    return SolverPlayer(size, depth, table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless 3D tic-tac-toe matches and benchmark.")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE)
+    parser.add_argument("--games", type=int, default=10000, help="games per matchup")
+    parser.add_argument("--solver-games", type=int, default=200,
+                        help="games per matchup with the solver, which moves one game at a time")
+    parser.add_argument("--players", nargs="+", choices=["random", "heuristic", "solver"],
+                        default=["random", "heuristic", "solver"])
+    parser.add_argument("--depth", type=int, help="solver search depth (default: perfect play, 3x3x3 only)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    depth = args.depth
+    if depth is None and args.size != 3:
+        depth = 3
+    table = None
+    if depth is None and os.path.exists(TABLE_FILE):
+        table = SolvedTable(TABLE_FILE, args.size)
+
+    print(f"{args.size}x{args.size}x{args.size}, {len(geometry(args.size).lines)} lines")
+    start = time.perf_counter()
+    results = play_one_by_one(min(args.games, 2000), args.size, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{'random vs random, one at a time':34} {sum(results) / elapsed:>10.0f} games/s  "
+          f"X {results[0]:>6}  O {results[1]:>6}  draws {results[2]:>6}")
+
+    for x_name in args.players:
+        for o_name in args.players:
+            games = args.solver_games if "solver" in (x_name, o_name) else args.games
+            players = [make_player(x_name, args.size, args.seed, depth, table),
+                       make_player(o_name, args.size, args.seed + 1, depth, table)]
+            start = time.perf_counter()
+            results = GameBatch(games, args.size).run(players)
+            elapsed = time.perf_counter() - start
+            print(f"{x_name + ' vs ' + o_name:34} {games / elapsed:>10.0f} games/s  "
+                  f"X {results[0]:>6}  O {results[1]:>6}  draws {results[2]:>6}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+import argparse
+import bisect
+import itertools
+import mmap
+import os
+import struct
+import sys
+import time
+
+from board import Board, PLAYERS, DEFAULT_SIZE, geometry
+
+# Perfect play for 3D tic-tac-toe. Scores are from the side to move: a win
+# is worth cells + 1 minus the number of cells filled when it happens, so
+# faster wins score higher and slower losses lower, and a draw is 0.
+# Depth-limited searches score the positions where they stop with
+# evaluate(), which stays strictly between -1 and 1.
+#
+#   python solver.py solve            # solve the empty board and print the value
+#   python solver.py solve --size 4 --depth 3
+#   python solver.py build            # write solved.bin for the AI player
+#
+# Positions that are rotations or reflections of each other share one
+# transposition table entry and one record in solved.bin.
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+TABLE_FILE = os.path.join(ASSET_DIR, "solved.bin")
+
+MAGIC = b"T3D1"
+HEADER = struct.Struct(">4sHHQ")  # magic, board size, unused, record count
+RECORD = struct.Struct(">QbB")  # canonical key, score, best move in the canonical position
+KEY = struct.Struct(">Q")
+
+EXACT, LOWER, UPPER = 0, 1, 2
+CHUNK_BITS = 9
+_CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+class Symmetries:
+    """The 48 symmetries of an N x N x N cube, built once per size by symmetries().
+
+    Position keys are x | o << cells. Mapping a key through a symmetry
+    takes one table lookup per CHUNK_BITS bits instead of one step per cell.
+    """
+
+    def __init__(self, size):
+        self.geometry = geometry(size)
+        cells = self.geometry.cells
+        # Any order of the three axes, each axis possibly reversed.
+        self.permutations = []
+        for axes in itertools.permutations(range(3)):
+            for flips in itertools.product((False, True), repeat=3):
+                permutation = []
+                for cell in range(cells):
+                    coords = self.geometry.cell_coords(cell)
+                    moved = [coords[axis] for axis in axes]
+                    permutation.append(self.geometry.cell_index(
+                        *(size - 1 - v if flip else v for v, flip in zip(moved, flips))))
+                self.permutations.append(permutation)
+        self.inverses = [[0] * cells for _ in self.permutations]
+        for permutation, inverse in zip(self.permutations, self.inverses):
+            for cell, image in enumerate(permutation):
+                inverse[image] = cell
+        self.tables = [self._chunk_tables(permutation) for permutation in self.permutations]
+
+    def _chunk_tables(self, permutation):
+        cells = self.geometry.cells
+        tables = []
+        for start in range(0, 2 * cells, CHUNK_BITS):
+            bits = min(CHUNK_BITS, 2 * cells - start)
+            images = []
+            for position in range(start, start + bits):
+                player, cell = divmod(position, cells)
+                images.append(1 << (permutation[cell] + player * cells))
+            # Each entry is the entry without its lowest bit plus that bit's image.
+            table = [0] * (1 << bits)
+            for value in range(1, 1 << bits):
+                low = value & -value
+                table[value] = table[value ^ low] | images[low.bit_length() - 1]
+            tables.append(table)
+        return tables
+
+    def canonical(self, key):
+        # (smallest key over the 48 symmetries, index of the symmetry giving it).
+        best, best_symmetry = None, 0
+        for symmetry, tables in enumerate(self.tables):
+            mapped = 0
+            rest = key
+            for table in tables:
+                mapped |= table[rest & _CHUNK_MASK]
+                rest >>= CHUNK_BITS
+            if best is None or mapped < best:
+                best, best_symmetry = mapped, symmetry
+        return best, best_symmetry
+
+
+_symmetries = {}
+
+
+def symmetries(size=DEFAULT_SIZE):
+    if size not in _symmetries:
+        _symmetries[size] = Symmetries(size)
+    return _symmetries[size]
+
+
+def position_key(board):
+    return board.masks[0] | board.masks[1] << board.cells
+
+
+def canonical(board):
+    return symmetries(board.size).canonical(position_key(board))
+
+
+def threats(board, player):
+    # Mask of the empty cells that would complete a line for *player*.
+    mine, theirs = board.counts[player], board.counts[player ^ 1]
+    free = ~board.occupied
+    target = board.size - 1
+    cells = 0
+    for line, mask in enumerate(board.geometry.line_masks):
+        if mine[line] == target and not theirs[line]:
+            cells |= mask & free
+    return cells
+
+
+def evaluate(board):
+    # Open lines for the side to move minus open lines for the other side,
+    # weighted by how full they are, scaled into (-1, 1).
+    mine, theirs = board.counts[board.turn], board.counts[board.turn ^ 1]
+    total = 0
+    for line in range(len(mine)):
+        if not theirs[line]:
+            total += 4 ** mine[line]
+        elif not mine[line]:
+            total -= 4 ** theirs[line]
+    return total / (len(mine) * 4 ** board.size + 1)
+
+
+def _order(board, cells):
+    # Cells on many lines still open to either side first; lines the mover
+    # is closer to completing count more.
+    mine, theirs = board.counts[board.turn], board.counts[board.turn ^ 1]
+    cell_lines = board.geometry.cell_lines
+
+    def weight(cell):
+        total = 0
+        for line in cell_lines[cell]:
+            if not theirs[line]:
+                total += (mine[line] + 1) ** 2
+            if not mine[line]:
+                total += theirs[line] ** 2
+        return total
+
+    return sorted(cells, key=weight, reverse=True)
+
+
+def _cells(mask):
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(low.bit_length() - 1)
+        mask ^= low
+    return cells
+
+
+class SolvedTable:
+    """Read-only, memory-mapped solved.bin: scores and best moves by canonical key."""
+
+    def __init__(self, path=TABLE_FILE, size=DEFAULT_SIZE):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, stored_size, _, count = HEADER.unpack_from(self._map)
+        except (ValueError, struct.error):
+            self._file.close()
+            raise ValueError(f"not a solved table: {path}")
+        if magic != MAGIC or stored_size != size or len(self._map) != HEADER.size + count * RECORD.size:
+            self.close()
+            raise ValueError(f"not a solved table for a {size}x{size}x{size} board: {path}")
+        self._count = count
+        self._keys = _KeyView(self._map, count)
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def probe(self, key):
+        # (score, canonical move) for a canonical key, or None.
+        index = bisect.bisect_left(self._keys, key)
+        if index < self._count and self._keys[index] == key:
+            _, score, move = RECORD.unpack_from(self._map, HEADER.size + index * RECORD.size)
+            return score, move
+        return None
+
+
+class _KeyView:
+    # Sequence of the record keys, for bisect.
+
+    def __init__(self, data, count):
+        self._data = data
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        return KEY.unpack_from(self._data, HEADER.size + index * RECORD.size)[0]
+
+
+def write_table(path, records, size=DEFAULT_SIZE):
+    # *records* maps canonical keys to (score, canonical move).
+    if 2 * geometry(size).cells > 8 * KEY.size:
+        raise ValueError(f"position keys of a {size}x{size}x{size} board don't fit in a table record")
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, size, 0, len(records)))
+        for key in sorted(records):
+            f.write(RECORD.pack(key, *records[key]))
+    return len(records)
+
+
+class Solver:
+    """Negamax with alpha-beta over a transposition table of canonical positions.
+
+    Without *max_depth* every search is played out to the end, which only
+    finishes quickly on the 3x3x3 board; with it, larger boards get a
+    heuristic player. With a SolvedTable, positions in it are answered
+    without searching.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, table=None, max_depth=None):
+        self.size = size
+        self.cells = geometry(size).cells
+        self.symmetries = symmetries(size)
+        self.table = table
+        self.max_depth = max_depth
+        # canonical key -> (score, bound, canonical move, depth searched)
+        self.tt = {}
+        self.nodes = 0
+
+    def solve(self, board):
+        depth = self.cells if self.max_depth is None else self.max_depth
+        return self._negamax(board, -self.cells - 1, self.cells + 1, depth)
+
+    def best_move(self, board):
+        # The cell to play, keeping the best score for the side to move.
+        if self.table is not None:
+            key, symmetry = self.symmetries.canonical(position_key(board))
+            stored = self.table.probe(key)
+            if stored is not None:
+                return self.symmetries.inverses[symmetry][stored[1]]
+        self.solve(board)
+        return self._tt_move(board)
+
+    def _tt_move(self, board):
+        key, symmetry = self.symmetries.canonical(position_key(board))
+        return self.symmetries.inverses[symmetry][self.tt[key][2]]
+
+    def _negamax(self, board, alpha, beta, depth):
+        self.nodes += 1
+        cells = self.cells
+        me = board.turn
+        plies = len(board.moves)
+        if board.winner is not None:
+            return -(cells + 1 - plies)
+        if board.is_full():
+            return 0
+
+        # Won at once, lost to two threats, or forced to block one.
+        wins = threats(board, me)
+        if wins:
+            return self._store(board, cells - plies, _cells(wins)[0])
+        blocks = threats(board, me ^ 1)
+        if blocks & (blocks - 1):
+            return self._store(board, -(cells - plies - 1), _cells(blocks)[0])
+        if depth == 0:
+            return evaluate(board)
+
+        key, symmetry = self.symmetries.canonical(position_key(board))
+        entry = self.tt.get(key)
+        if entry is None and self.table is not None:
+            stored = self.table.probe(key)
+            if stored is not None:
+                entry = self.tt[key] = (stored[0], EXACT, stored[1], cells)
+        first = None
+        if entry is not None:
+            score, bound, move, searched = entry
+            if searched >= depth and (bound == EXACT or (bound == LOWER and score >= beta) or
+                                      (bound == UPPER and score <= alpha)):
+                return score
+            first = self.symmetries.inverses[symmetry][move]
+
+        moves = [_cells(blocks)[0]] if blocks else _order(board, _cells(~board.occupied & board.geometry.full_mask))
+        if first is not None and first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+
+        original_alpha = alpha
+        best, best_move = -cells - 1, moves[0]
+        for cell in moves:
+            board.play(cell)
+            score = -self._negamax(board, -beta, -alpha, depth - 1)
+            board.undo()
+            if score > best:
+                best, best_move = score, cell
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+
+        bound = UPPER if best <= original_alpha else LOWER if best >= beta else EXACT
+        if depth >= cells - plies:
+            depth = cells  # searched to the end, good for any depth
+        self.tt[key] = (best, bound, self.symmetries.permutations[symmetry][best_move], depth)
+        return best
+
+    def _store(self, board, score, cell):
+        # Scores found without a search are exact at any depth.
+        key, symmetry = self.symmetries.canonical(position_key(board))
+        self.tt[key] = (score, EXACT, self.symmetries.permutations[symmetry][cell], self.cells)
+        return score
+
+
+def build_table(solver):
+    # Every position either side can face when the AI plays its best move
+    # and the other player plays anything, with exact scores. Searched
+    # positions not on that tree are left out.
+    records = {}
+    board = Board(solver.size)
+    canonical_key = solver.symmetries.canonical
+
+    def visit(ai):
+        if board.is_over():
+            return
+        if board.turn == ai:
+            key, symmetry = canonical_key(position_key(board))
+            if key in records:
+                return
+            score = solver.solve(board)
+            cell = solver._tt_move(board)
+            records[key] = (score, solver.symmetries.permutations[symmetry][cell])
+            board.play(cell)
+            visit(ai)
+            board.undo()
+        else:
+            seen = set()
+            for cell in board.empty_cells():
+                board.play(cell)
+                key = canonical_key(position_key(board))[0]
+                if key not in seen:
+                    seen.add(key)
+                    visit(ai)
+                board.undo()
+
+    for ai in range(len(PLAYERS)):
+        visit(ai)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve 3D tic-tac-toe.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    solve = commands.add_parser("solve", help="solve the empty board")
+    solve.add_argument("--depth", type=int, help="plies to search (default: to the end)")
+    build = commands.add_parser("build", help="write the table the AI player reads")
+    build.add_argument("-o", "--output", default=TABLE_FILE)
+    for command in (solve, build):
+        command.add_argument("--size", type=int, default=DEFAULT_SIZE)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == "solve":
+        solver = Solver(args.size, max_depth=args.depth)
+        board = Board(args.size)
+        score = solver.solve(board)
+        cell = solver._tt_move(board)
+        if abs(score) >= 1:
+            outcome = f"{PLAYERS[0] if score > 0 else PLAYERS[1]} wins after {solver.cells + 1 - abs(score)} moves"
+        else:
+            outcome = "draw" if args.depth is None else f"score {score:+.4f} at depth {args.depth}"
+        print(f"{outcome}, best first move {board.geometry.cell_coords(cell)}")
+    else:
+        solver = Solver(args.size)
+        count = write_table(args.output, build_table(solver), args.size)
+        print(f"wrote {count} positions to {args.output}")
+    print(f"{solver.nodes} nodes, {len(solver.tt)} table entries, {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
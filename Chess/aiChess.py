@@ -1,11 +1,39 @@
 import pygame
 import chess
 
+from client import NetworkPlayer
+from game import Game
+from gamelog import GameLog, Replay
+from sprites import PieceSprites
+from variant import VariantMove, TELEPORT, DOUBLE_JUMP
+from worker import EngineWorker
+
 pygame.init()
 WIDTH, HEIGHT = 640, 740  # Height includes scoreboard
 SQUARE_SIZE = 80
 SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("2-Player Chess")
+
+# Side played by the engine (None for two players) and its thinking time per move in seconds
+AI_COLOR = None
+AI_TIME_LIMIT = 1.0
+# (host, port) of a server.py to play someone else through instead; AI_COLOR is ignored then
+SERVER = None
+if SERVER is not None:
+    CAPTION = "Network Chess"
+else:
+    CAPTION = "2-Player Chess" if AI_COLOR is None else "Chess vs AI"
+pygame.display.set_caption(CAPTION)
+
+# Finished games are appended to games.pgn and games.vgl next to this file (False turns that off).
+# After a game, Left/Right/Home/End step through it.
+LOG_GAMES = True
+
+# Sleep in pygame.event.wait until something happens instead of redrawing at 30 FPS.
+# The engine process and the server connection wake the loop with ENGINE_EVENT; the timeout
+# is only a fallback.
+EVENT_DRIVEN = True
+ENGINE_POLL_MS = 250
+ENGINE_EVENT = pygame.event.custom_type()
 
 # Colors (Lichess style)
 LIGHT = (240, 217, 181)
@@ -15,121 +43,304 @@ HOVER_COLOR = (200, 200, 50)
 DARK_GRAY = (50, 50, 50)
 FONT = pygame.font.SysFont("timesnewroman", 20)
 
-# Load images (Lichess-style PNGs named like 'wp.png', 'bk.png')
-IMAGES = {}
+# Piece images (Lichess style) come from a packed atlas and are scaled lazily per size
+SPRITES = PieceSprites()
 BASE_PIECE_SIZE = int(SQUARE_SIZE * 0.8)
 HOVER_PIECE_SIZE = SQUARE_SIZE
 
-for color in ['w', 'b']:
-    for piece in ['p', 'r', 'n', 'b', 'q', 'k']:
-        name = f"{color}{piece}"
-        img = pygame.image.load(f"{name}.png")
-        IMAGES[name] = {
-            'normal': pygame.transform.scale(img, (BASE_PIECE_SIZE, BASE_PIECE_SIZE)),
-            'hover': pygame.transform.scale(img, (HOVER_PIECE_SIZE, HOVER_PIECE_SIZE))
-        }
-
-def draw_board(board, selected=None, legal_moves=[], hover_square=None):
-    for rank in range(8):
-        for file in range(8):
-            square = chess.square(file, 7 - rank)
-            rect = pygame.Rect(file*SQUARE_SIZE, rank*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
-            color = LIGHT if (rank + file) % 2 == 0 else DARK
-            pygame.draw.rect(SCREEN, color, rect)
-
-            if square == selected:
-                pygame.draw.rect(SCREEN, HIGHLIGHT, rect, 4)
-            elif square == hover_square:
-                pygame.draw.rect(SCREEN, HOVER_COLOR, rect, 4)
-            elif square in legal_moves:
-                pygame.draw.circle(SCREEN, HIGHLIGHT, rect.center, 10)
-
-            piece = board.piece_at(square)
-            if piece:
-                piece_str = f"{'w' if piece.color else 'b'}{piece.symbol().lower()}"
-                if square == hover_square:
-                    piece_img = IMAGES[piece_str]['hover']
-                    offset = (SQUARE_SIZE - HOVER_PIECE_SIZE) // 2
-                else:
-                    piece_img = IMAGES[piece_str]['normal']
-                    offset = (SQUARE_SIZE - BASE_PIECE_SIZE) // 2
-                SCREEN.blit(piece_img, (file*SQUARE_SIZE + offset, rank*SQUARE_SIZE + offset))
-
-    for i in range(8):
-        file_label = FONT.render(chr(ord('a') + i), True, (0, 0, 0))
-        rank_label = FONT.render(str(8 - i), True, (0, 0, 0))
-        SCREEN.blit(file_label, (i * SQUARE_SIZE + 5, HEIGHT - 100))
-        SCREEN.blit(rank_label, (5, i * SQUARE_SIZE + 5))
-
-def draw_scoreboard(captured_white, captured_black, white_score, black_score, draws, game_over, white_teleport_used, black_teleport_used):
-    pygame.draw.rect(SCREEN, DARK_GRAY, (0, 640, WIDTH, 100))
-    SCREEN.blit(FONT.render(f"White Captured: {''.join(captured_white)}", True, (255, 255, 255)), (10, 645))
-    SCREEN.blit(FONT.render(f"Black Captured: {''.join(captured_black)}", True, (255, 255, 255)), (10, 670))
-    scoreboard = f"Score - White: {white_score}  Black: {black_score}  Draws: {draws}"
-    SCREEN.blit(FONT.render(scoreboard, True, (255, 255, 255)), (10, 700))
-    SCREEN.blit(FONT.render(f"Teleport Used (White): {'Yes' if white_teleport_used else 'No'}", True, (255, 255, 255)), (350, 645))
-    SCREEN.blit(FONT.render(f"Teleport Used (Black): {'Yes' if black_teleport_used else 'No'}", True, (255, 255, 255)), (350, 670))
-
-    if game_over:
-        pygame.draw.rect(SCREEN, (90, 90, 90), (480, 680, 140, 40))
-        SCREEN.blit(FONT.render("Restart", True, (255, 255, 255)), (510, 690))
+class BoardView:
+    """Retained rendering of the board and scoreboard.
+
+    Keeps what each square and the scoreboard last showed and redraws only
+    what changed, returning the dirty rects for pygame.display.update().
+    """
+
+    def __init__(self):
+        self.background = pygame.Surface((8 * SQUARE_SIZE, 8 * SQUARE_SIZE))
+        for rank in range(8):
+            for file in range(8):
+                color = LIGHT if (rank + file) % 2 == 0 else DARK
+                pygame.draw.rect(self.background, color, (file*SQUARE_SIZE, rank*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+
+        # Coordinate labels are drawn over pieces, so keep them apart from the background.
+        self.labels = {}
+        for i in range(8):
+            rank_label = FONT.render(str(8 - i), True, (0, 0, 0))
+            self.labels[chess.square(0, 7 - i)] = [(rank_label, (5, 5))]
+        for i in range(8):
+            file_label = FONT.render(chr(ord('a') + i), True, (0, 0, 0))
+            offset = (SQUARE_SIZE - file_label.get_width() - 5, SQUARE_SIZE - file_label.get_height() - 2)
+            self.labels.setdefault(chess.square(i, 0), []).append((file_label, offset))
+
+        self._text_cache = {}
+        self.invalidate()
+
+    def invalidate(self):
+        # Forces a full redraw, e.g. after the window was exposed.
+        self._squares = [None] * 64
+        self._last_key = None
+        self._scoreboard = None
+
+    def _text(self, text):
+        surface = self._text_cache.get(text)
+        if surface is None:
+            if len(self._text_cache) > 64:
+                self._text_cache.clear()
+            surface = self._text_cache[text] = FONT.render(text, True, (255, 255, 255))
+        return surface
+
+    def draw(self, board, selected, legal_moves, hover_square, scoreboard):
+        dirty = []
+
+        key = (board.occupied_co[chess.WHITE], board.pawns, board.knights, board.bishops, board.rooks,
+               board.queens, board.kings, selected, int(legal_moves), hover_square)
+        if key != self._last_key:
+            self._last_key = key
+            for square in chess.SQUARES:
+                rect = self._draw_square(board, square, selected, legal_moves, hover_square)
+                if rect is not None:
+                    dirty.append(rect)
+
+        if scoreboard != self._scoreboard:
+            self._scoreboard = scoreboard
+            dirty.append(self._draw_scoreboard(*scoreboard))
+
+        return dirty
+
+    def _draw_square(self, board, square, selected, legal_moves, hover_square):
+        if square == selected:
+            marker = 1
+        elif square == hover_square:
+            marker = 2
+        elif square in legal_moves:
+            marker = 3
+        else:
+            marker = 0
+        piece = board.piece_at(square)
+        state = (piece, marker, square == hover_square)
+        if state == self._squares[square]:
+            return None
+        self._squares[square] = state
+
+        file = chess.square_file(square)
+        rank = 7 - chess.square_rank(square)
+        rect = pygame.Rect(file*SQUARE_SIZE, rank*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+        SCREEN.blit(self.background, rect, rect)
+
+        if marker == 1:
+            pygame.draw.rect(SCREEN, HIGHLIGHT, rect, 4)
+        elif marker == 2:
+            pygame.draw.rect(SCREEN, HOVER_COLOR, rect, 4)
+        elif marker == 3:
+            pygame.draw.circle(SCREEN, HIGHLIGHT, rect.center, 10)
+
+        if piece:
+            piece_str = f"{'w' if piece.color else 'b'}{piece.symbol().lower()}"
+            size = HOVER_PIECE_SIZE if square == hover_square else BASE_PIECE_SIZE
+            piece_img = SPRITES.get(piece_str, size)
+            offset = (SQUARE_SIZE - size) // 2
+            SCREEN.blit(piece_img, (rect.x + offset, rect.y + offset))
+
+        for label, (dx, dy) in self.labels.get(square, ()):
+            SCREEN.blit(label, (rect.x + dx, rect.y + dy))
+        return rect
+
+    def _draw_scoreboard(self, captured_white, captured_black, white_score, black_score, draws, game_over,
+                         white_teleport_used, black_teleport_used):
+        rect = pygame.Rect(0, 640, WIDTH, 100)
+        pygame.draw.rect(SCREEN, DARK_GRAY, rect)
+        SCREEN.blit(self._text(f"White Captured: {''.join(captured_white)}"), (10, 645))
+        SCREEN.blit(self._text(f"Black Captured: {''.join(captured_black)}"), (10, 670))
+        SCREEN.blit(self._text(f"Score - White: {white_score}  Black: {black_score}  Draws: {draws}"), (10, 700))
+        SCREEN.blit(self._text(f"Teleport Used (White): {'Yes' if white_teleport_used else 'No'}"), (350, 645))
+        SCREEN.blit(self._text(f"Teleport Used (Black): {'Yes' if black_teleport_used else 'No'}"), (350, 670))
+
+        if game_over:
+            pygame.draw.rect(SCREEN, (90, 90, 90), (480, 680, 140, 40))
+            SCREEN.blit(self._text("Restart"), (510, 690))
+        return rect
 
 def restart_button_clicked(pos):
     x, y = pos
     return 480 <= x <= 620 and 680 <= y <= 720
 
+def update_caption(board, worker, remote=None):
+    # Shows the engine's progress while it thinks, or the side played over the network.
+    caption = CAPTION
+    if worker is not None and worker.request_id is not None and not worker.pondering and \
+            worker.best_move is not None:
+        caption += f" - thinking: depth {worker.depth}, best {worker.best_move.uci()}"
+    if remote is not None:
+        caption += " - waiting for an opponent" if remote.color is None else \
+            f" - playing {'White' if remote.color else 'Black'}"
+    if pygame.display.get_caption()[0] != caption:
+        pygame.display.set_caption(caption)
+
+def start_engine():
+    # The engine worker for local play, or None when two players share the board.
+    if AI_COLOR is None:
+        return None
+    return EngineWorker(time_limit=AI_TIME_LIMIT,
+                        notify=lambda: pygame.event.post(pygame.event.Event(ENGINE_EVENT)))
+
+def drop_remote(remote):
+    # The server can't be reached any more; the game carries on locally.
+    if remote is not None:
+        remote.close()
+    pygame.display.set_caption(CAPTION)
+    return None
+
 def main():
-    board = chess.Board()
+    game = Game()
+    board = game.board
+    worker = None
+    remote = None
+    remote_result = None  # set when the server ends the game
+    if SERVER is not None:
+        try:
+            remote = NetworkPlayer(*SERVER, notify=lambda: pygame.event.post(pygame.event.Event(ENGINE_EVENT)))
+            remote.seek()
+        except OSError:
+            remote = drop_remote(remote)
+    if remote is None:
+        worker = start_engine()
     clock = pygame.time.Clock()
+    view = BoardView()
     selected_square = None
-    legal_moves = []
+    selected_kind = None  # TELEPORT or DOUBLE_JUMP after a right click
+    jump_origin = None
+    legal_moves = chess.SquareSet()
     hover_square = None
 
-    captured_white, captured_black = [], []
     white_score = black_score = draws = 0
     game_over = False
+    log = GameLog() if LOG_GAMES else None
+    replay = None  # the finished game, browsed with the arrow keys
+    replay_game = None  # position shown instead of the game while browsing
+    replay_ply = 0  # ply of replay_game
 
-    white_teleport_used = False
-    black_teleport_used = False
-
-    knight_double_jump = None
-    knight_double_jump_pending = False
-    knight_cooldown = {chess.WHITE: 0, chess.BLACK: 0}
+    if EVENT_DRIVEN:
+        # Keep events that can't change the picture from waking the loop.
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION, pygame.WINDOWLEAVE,
+                                  pygame.KEYDOWN, pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, ENGINE_EVENT])
 
     running = True
     while running:
-        draw_board(board, selected_square, legal_moves, hover_square)
-        draw_scoreboard(captured_white, captured_black, white_score, black_score, draws, game_over, white_teleport_used, black_teleport_used)
-        pygame.display.flip()
-        clock.tick(30)
-
-        hover_square = None
-        mouse_pos = pygame.mouse.get_pos()
-        if mouse_pos[1] < 640:
-            col = mouse_pos[0] // SQUARE_SIZE
-            row = 7 - (mouse_pos[1] // SQUARE_SIZE)
-            hover_square = chess.square(col, row)
-
-        for event in pygame.event.get():
+        if worker is not None:
+            # The engine searches in its own process; the loop only polls for its answer.
+            move = worker.poll()
+            if move is not None and board.turn == AI_COLOR and move in board.legal_moves:
+                game.play(move)
+                reply = worker.expected_reply
+                if reply is not None and reply in board.legal_moves:
+                    worker.ponder(board, reply)
+            elif board.turn == AI_COLOR and worker.request_id is None and not (game_over or game.is_over()):
+                worker.request(board)
+            update_caption(board, worker)
+
+        if remote is not None:
+            # The server checks every move and sends it back to both players, ours included.
+            message = remote.poll()
+            while message is not None:
+                if message[0] == "start":
+                    game.reset()
+                    game_over = False
+                    remote_result = None
+                    replay = replay_game = None
+                elif message[0] == "moved" and message[1] == len(board.move_stack) + 1:
+                    game.play(message[2])
+                elif message[0] == "end":
+                    remote_result = message[1]
+                elif message[0] == "closed":
+                    # The server is gone: a game in progress ends unfinished, and play carries on locally.
+                    if board.move_stack:
+                        remote_result = "*"
+                    remote = drop_remote(remote)
+                    worker = start_engine()
+                    break
+                message = remote.poll()
+            update_caption(board, worker, remote)
+
+        shown = game if replay_game is None else replay_game
+        scoreboard = (tuple(shown.captured_white), tuple(shown.captured_black), white_score, black_score, draws,
+                      game_over, shown.board.teleport_used[chess.WHITE], shown.board.teleport_used[chess.BLACK])
+        dirty = view.draw(shown.board, selected_square, legal_moves, hover_square, scoreboard)
+        if dirty:
+            pygame.display.update(dirty)
+
+        if EVENT_DRIVEN:
+            thinking = worker is not None and worker.request_id is not None and not worker.pondering
+            timeout = ENGINE_POLL_MS if thinking else 0  # 0 waits for input indefinitely
+            events = [pygame.event.wait(timeout)] + pygame.event.get()
+        else:
+            clock.tick(30)
+            events = pygame.event.get()
+
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
 
+            elif event.type == pygame.MOUSEMOTION:
+                x, y = event.pos
+                hover_square = chess.square(x // SQUARE_SIZE, 7 - y // SQUARE_SIZE) if 0 <= y < 640 else None
+
+            elif event.type == pygame.WINDOWLEAVE:
+                hover_square = None
+
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                view.invalidate()
+
+            elif event.type == pygame.KEYDOWN and game_over and replay is not None:
+                # Replay of the finished game; each step seeks from the nearest checkpoint.
+                ply = len(replay) if replay_game is None else replay_ply
+                if event.key in (pygame.K_LEFT, pygame.K_BACKSPACE):
+                    ply -= 1
+                elif event.key == pygame.K_RIGHT:
+                    ply += 1
+                elif event.key == pygame.K_HOME:
+                    ply = 0
+                elif event.key == pygame.K_END:
+                    ply = len(replay)
+                replay_ply = max(0, min(ply, len(replay)))
+                replay_game = replay.seek(replay_ply)
+
+            elif event.type == pygame.KEYDOWN and event.key in (pygame.K_LEFT, pygame.K_BACKSPACE, pygame.K_RIGHT):
+                # Left/Backspace takes a move back, Right replays it.
+                if game_over or remote is not None:
+                    continue
+                step = game.redo if event.key == pygame.K_RIGHT else game.undo
+                if worker is not None:
+                    worker.cancel()
+                # Against the engine, step over its moves too, so it is the player's turn again.
+                while step() is not None and board.turn == AI_COLOR:
+                    pass
+                selected_square = None
+                selected_kind = None
+                jump_origin = None
+                legal_moves = chess.SquareSet()
+
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 pos = pygame.mouse.get_pos()
 
                 if game_over and restart_button_clicked(pos):
-                    board.reset()
-                    captured_white.clear()
-                    captured_black.clear()
-                    white_teleport_used = False
-                    black_teleport_used = False
-                    knight_double_jump = None
-                    knight_double_jump_pending = False
-                    knight_cooldown = {chess.WHITE: 0, chess.BLACK: 0}
+                    if worker is not None:
+                        worker.new_game()
+                    if remote is not None:
+                        try:
+                            remote.seek()
+                        except OSError:
+                            remote = drop_remote(remote)
+                            worker = start_engine()
+                    remote_result = None
+                    game.reset()
                     game_over = False
+                    replay = replay_game = None
                     continue
 
-                if board.is_game_over():
+                if game.is_over() or game_over:
+                    continue
+                if board.turn == AI_COLOR if remote is None else board.turn != remote.color:
                     continue
 
                 x, y = pos
@@ -142,71 +353,77 @@ def main():
                 if event.button == 3:
                     piece = board.piece_at(square)
                     if piece and piece.color == board.turn:
-                        if piece.piece_type == chess.QUEEN:
-                            teleport_used = white_teleport_used if board.turn == chess.WHITE else black_teleport_used
-                            if not teleport_used:
-                                selected_square = square
-                                legal_moves = [sq for sq in chess.SQUARES if board.piece_at(sq) is None]
-                                continue
-                        elif piece.piece_type == chess.KNIGHT and knight_cooldown[board.turn] == 0:
-                            knight_double_jump = square
-                            knight_double_jump_pending = True
+                        if piece.piece_type == chess.QUEEN and not board.teleport_used[board.turn]:
                             selected_square = square
-                            legal_moves = [m.to_square for m in board.legal_moves if m.from_square == square]
+                            selected_kind = TELEPORT
+                            legal_moves = game.teleport_targets(square)
+                            continue
+                        elif piece.piece_type == chess.KNIGHT and board.knight_cooldown[board.turn] == 0:
+                            selected_square = jump_origin = square
+                            selected_kind = DOUBLE_JUMP
+                            legal_moves = game.double_jump_vias(square)
                             continue
 
                 if selected_square is None:
                     piece = board.piece_at(square)
                     if piece and piece.color == board.turn:
                         selected_square = square
-                        legal_moves = [m.to_square for m in board.legal_moves if m.from_square == square]
-                else:
-                    if square in legal_moves and board.piece_at(selected_square) and board.piece_at(selected_square).piece_type == chess.QUEEN and board.piece_at(square) is None:
-                        board.remove_piece_at(selected_square)
-                        board.set_piece_at(square, chess.Piece(chess.QUEEN, board.turn))
-                        if board.turn == chess.WHITE:
-                            white_teleport_used = True
-                        else:
-                            black_teleport_used = True
-                        board.turn = not board.turn
+                        legal_moves = game.legal_targets(square)
+                    continue
+
+                move = None
+                if square in legal_moves:
+                    if selected_kind == TELEPORT:
+                        move = VariantMove.teleport(selected_square, square)
+                    elif selected_kind == DOUBLE_JUMP and selected_square == jump_origin:
+                        # First hop picked; show where the knight can go next without ending the turn.
+                        selected_square = square
+                        legal_moves = game.double_jump_targets(jump_origin, square)
+                        continue
+                    elif selected_kind == DOUBLE_JUMP:
+                        move = VariantMove.double_jump(jump_origin, selected_square, square)
                     else:
-                        move = chess.Move(selected_square, square)
-                        if move in board.legal_moves:
-                            captured = board.piece_at(square)
-                            if captured:
-                                (captured_black if board.turn else captured_white).append(captured.symbol())
-                            board.push(move)
-
-                            if knight_double_jump_pending:
-                                if knight_double_jump == selected_square:
-                                    selected_square = square
-                                    legal_moves = [m.to_square for m in board.legal_moves if m.from_square == square]
-                                    knight_double_jump_pending = False  # Allow second move without switching turn
-                                    knight_double_jump = square
-                                    continue
-                                elif knight_double_jump == square:
-                                    knight_double_jump = None
-                                    knight_cooldown[board.turn] = 3
-
-                            if not knight_double_jump_pending:
-                                if board.is_game_over():
-                                    result = board.result()
-                                    if result == '1-0':
-                                        white_score += 1
-                                    elif result == '0-1':
-                                        black_score += 1
-                                    else:
-                                        draws += 1
-                                    game_over = True
-                                # Decrease cooldowns at the end of the turn
-                                for color in [chess.WHITE, chess.BLACK]:
-                                    if knight_cooldown[color] > 0:
-                                        knight_cooldown[color] -= 1
-                                board.turn = not board.turn
-
-                    selected_square = None
-                    legal_moves = []
+                        move = board.find_move(selected_square, square)
+
+                if move is not None and remote is not None:
+                    try:
+                        remote.move(move)
+                        move = None  # played once the server echoes it
+                    except OSError:
+                        remote = drop_remote(remote)
+                        worker = start_engine()
+                if move is not None:
+                    game.play(move)
+                    if worker is not None and worker.pondering:
+                        if move == worker.ponder_move:
+                            worker.ponderhit()
+                        else:
+                            worker.cancel()
+
+                selected_square = None
+                selected_kind = None
+                jump_origin = None
+                legal_moves = chess.SquareSet()
+
+        if not game_over and (game.is_over() or remote_result is not None):
+            result = remote_result or game.result()
+            if result == '1-0':
+                white_score += 1
+            elif result == '0-1':
+                black_score += 1
+            elif result == '1/2-1/2':
+                draws += 1
+            game_over = True
+            replay = Replay.from_game(game)
+            if log is not None and game.board.move_stack:
+                log.append(game, {"Event": CAPTION}, result)
 
+    if worker is not None:
+        worker.close()
+    if remote is not None:
+        remote.close()
+    if log is not None:
+        log.close()
     pygame.quit()
 
 if __name__ == "__main__":
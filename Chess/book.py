@@ -0,0 +1,274 @@
+import argparse
+import collections
+import mmap
+import os
+import random
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+
+from engine import Engine
+from game import read_pgn
+from selfplay import play_game
+from variant import VariantBoard, VariantMove, TELEPORT, DOUBLE_JUMP, pack_state, unpack_state
+
+# Opening books and endgame tables share one file format: a header followed by
+# fixed-size records sorted by VariantBoard.zobrist_hash(), so the teleport
+# flags and knight cooldowns are part of the key. Lookups binary-search the
+# memory-mapped file and only touch the pages they read. Example:
+#
+#   python book.py book games.pgn --plies 20          # writes book.bin
+#   python book.py book --selfplay 500
+#   python book.py endgame games.pgn --pieces 5 --time 2   # writes endgame.bin
+#   python book.py probe book.bin "<fen>"
+#
+# The engine process picks up book.bin and endgame.bin from this directory.
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+BOOK_FILE = os.path.join(ASSET_DIR, "book.bin")
+ENDGAME_FILE = os.path.join(ASSET_DIR, "endgame.bin")
+
+MAGIC = b"VBK1"
+BOOK, ENDGAME = 0, 1
+HEADER = struct.Struct(">4sHHQ")  # magic, kind, unused, record count
+# Book records: value is how often the move was played and weight its
+# polyglot-style points (2 per win, 1 per draw). Endgame records: value is
+# the score in centipawns for the side to move and depth the search depth.
+RECORD = struct.Struct(">QIiHH")  # key, move, value, weight, depth
+KEY = struct.Struct(">Q")
+
+Entry = collections.namedtuple("Entry", "key move value weight depth")
+
+
+def encode_move(move):
+    # from | to << 6 | promotion << 12 | kind << 15 | via << 17
+    code = move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+    if isinstance(move, VariantMove):
+        code |= move.kind << 15
+        if move.kind == DOUBLE_JUMP:
+            code |= move.via << 17
+    return code
+
+
+def decode_move(code):
+    from_square = code & 63
+    to_square = code >> 6 & 63
+    kind = code >> 15 & 3
+    if kind == TELEPORT:
+        return VariantMove.teleport(from_square, to_square)
+    if kind == DOUBLE_JUMP:
+        return VariantMove.double_jump(from_square, code >> 17 & 63, to_square)
+    return chess.Move(from_square, to_square, code >> 12 & 7 or None)
+
+
+class PositionTable:
+    """Read-only, memory-mapped book or endgame file.
+
+    Opening one maps the file without reading it; each lookup is a binary
+    search over the records, so the file can be far larger than what is
+    ever paged in.
+    """
+
+    kind = None
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, kind, _, count = HEADER.unpack_from(self._map)
+        except (ValueError, struct.error):
+            self._file.close()
+            raise ValueError(f"not a book or endgame file: {path}")
+        if magic != MAGIC or kind != self.kind or len(self._map) != HEADER.size + count * RECORD.size:
+            self.close()
+            raise ValueError(f"not a {type(self).__name__} file: {path}")
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _key_at(self, index):
+        return KEY.unpack_from(self._map, HEADER.size + index * RECORD.size)[0]
+
+    def entries(self, board):
+        # All records for *board* whose move is legal there; anything else
+        # would be a hash collision.
+        key = board.zobrist_hash()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        for index in range(low, self._count):
+            entry = Entry._make(RECORD.unpack_from(self._map, HEADER.size + index * RECORD.size))
+            if entry.key != key:
+                break
+            move = decode_move(entry.move)
+            if board.is_legal(move):
+                entries.append(entry._replace(move=move))
+        return entries
+
+
+class OpeningBook(PositionTable):
+    kind = BOOK
+
+    def choose(self, board, rng=random):
+        # A book move picked in proportion to its weight, or None.
+        entries = [entry for entry in self.entries(board) if entry.weight]
+        if not entries:
+            return None
+        return rng.choices([entry.move for entry in entries], [entry.weight for entry in entries])[0]
+
+
+class EndgameTable(PositionTable):
+    kind = ENDGAME
+
+    def probe(self, board):
+        # The stored entry for *board*, or None.
+        entries = self.entries(board)
+        return entries[0] if entries else None
+
+
+def write_table(path, kind, records):
+    # *records* are (key, move code, value, weight, depth) tuples in any order.
+    records = sorted(records)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, kind, 0, len(records)))
+        for record in records:
+            f.write(RECORD.pack(*record))
+    return len(records)
+
+
+def build_book(games, plies=20, min_games=1):
+    # (key, move code) -> [times played, points]
+    stats = collections.defaultdict(lambda: [0, 0])
+    for headers, game in games:
+        result = headers.get("Result", "*")
+        board = game.board.root()
+        for move in game.board.move_stack[:plies]:
+            if result == "1/2-1/2" or result == "*":
+                points = 1
+            else:
+                points = 2 if (result == "1-0") == (board.turn == chess.WHITE) else 0
+            entry = stats[(board.zobrist_hash(), encode_move(move))]
+            entry[0] += 1
+            entry[1] += points
+            board.push(move)
+    return [(key, code, played, min(points, 0xFFFF), 0)
+            for (key, code), (played, points) in stats.items() if played >= min_games and points]
+
+
+def _analyse(fen, state, time_limit, max_depth):
+    board = VariantBoard(fen)
+    board.teleport_used, board.knight_cooldown = unpack_state(state)
+    engine = Engine(time_limit=time_limit, max_depth=max_depth, tt_size=1 << 16)
+    move = engine.search(board)
+    return board.zobrist_hash(), encode_move(move), engine.score, 1, engine.depth
+
+
+def build_endgame(games, max_pieces=5, time_limit=1.0, max_depth=64, workers=None):
+    # Searches every position with at most *max_pieces* pieces (kings
+    # included) that occurs in *games*, once each.
+    positions = {}
+    for headers, game in games:
+        board = game.board.root()
+        for move in game.board.move_stack + [None]:
+            if chess.popcount(board.occupied) <= max_pieces and not board.is_game_over():
+                positions.setdefault(board.zobrist_hash(),
+                                     (board.fen(), pack_state(board.teleport_used, board.knight_cooldown)))
+            if move is not None:
+                board.push(move)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_analyse, fen, state, time_limit, max_depth) for fen, state in positions.values()]
+        return [future.result() for future in futures]
+
+
+def selfplay_games(count, seed=0, workers=None):
+    # Engine-vs-engine games with a few random opening moves each for variety.
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_game, index, 0.05, 2, 300, 4, seed, 1 << 14) for index in range(count)]
+        for future in futures:
+            _, pgn, _ = future.result()
+            yield from read_pgn(pgn.splitlines())
+
+
+def _read_games(args):
+    for path in args.pgn:
+        with open(path) as f:
+            yield from read_pgn(f)
+    if args.selfplay:
+        yield from selfplay_games(args.selfplay, args.seed, args.workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and inspect opening books and endgame tables.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    book = commands.add_parser("book", help="build an opening book")
+    book.add_argument("--plies", type=int, default=20, help="plies per game to take into the book")
+    book.add_argument("--min-games", type=int, default=1, help="drop moves played fewer times")
+
+    endgame = commands.add_parser("endgame", help="build an endgame table")
+    endgame.add_argument("--pieces", type=int, default=5, help="largest number of pieces, kings included")
+    endgame.add_argument("--time", type=float, default=1.0, help="seconds of search per position")
+    endgame.add_argument("--depth", type=int, default=64, help="maximum search depth")
+
+    for command in (book, endgame):
+        command.add_argument("pgn", nargs="*", help="PGN files to read games from")
+        command.add_argument("--selfplay", type=int, default=0, help="also play this many games")
+        command.add_argument("--seed", type=int, default=0)
+        command.add_argument("--workers", type=int, default=None, help="processes (default: one per core)")
+        command.add_argument("-o", "--output", help="file to write")
+
+    probe = commands.add_parser("probe", help="list the entries for a position")
+    probe.add_argument("file")
+    probe.add_argument("fen", nargs="?", default=chess.STARTING_FEN)
+    args = parser.parse_args(argv)
+
+    if args.command == "probe":
+        board = VariantBoard(args.fen)
+        for table_type in (OpeningBook, EndgameTable):
+            try:
+                table = table_type(args.file)
+            except ValueError:
+                continue
+            with table:
+                print(f"{len(table)} records")
+                for entry in table.entries(board):
+                    print(f"{board.san(entry.move):12} value {entry.value:>7}  weight {entry.weight:>5}  "
+                          f"depth {entry.depth}")
+            return 0
+        print(f"not a book or endgame file: {args.file}", file=sys.stderr)
+        return 1
+
+    if not args.pgn and not args.selfplay:
+        parser.error("give PGN files and/or --selfplay")
+    if args.command == "book":
+        output = args.output or BOOK_FILE
+        count = write_table(output, BOOK, build_book(_read_games(args), args.plies, args.min_games))
+    else:
+        output = args.output or ENDGAME_FILE
+        records = build_endgame(_read_games(args), args.pieces, args.time, args.depth, args.workers)
+        count = write_table(output, ENDGAME, records)
+    print(f"wrote {count} records to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
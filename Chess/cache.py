@@ -0,0 +1,73 @@
+from collections import OrderedDict
+
+import chess
+
+from variant import VariantMove
+
+# Slots of a cache entry.
+_MOVES, _TARGETS = range(2)
+
+
+class PositionCache:
+    """LRU cache of legal move lists and per-square move targets.
+
+    Entries are keyed by ``VariantBoard.zobrist_hash()``, which covers the
+    teleport flags and knight cooldowns as well as the pieces. Callers that
+    already hold the key can pass it in to skip rehashing. Cached move lists
+    are shared, so don't modify them.
+    """
+
+    def __init__(self, max_entries=1 << 14):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, board, key):
+        if key is None:
+            key = board.zobrist_hash()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = self._entries[key] = [None, None]
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return entry
+
+    def legal_moves(self, board, key=None):
+        entry = self._entry(board, key)
+        if entry[_MOVES] is None:
+            entry[_MOVES] = list(board.legal_moves)
+        return entry[_MOVES]
+
+    def legal_targets_mask(self, board, square, key=None):
+        # Destinations of ordinary moves from *square*, built once per position
+        # from the cached move list.
+        entry = self._entry(board, key)
+        if entry[_TARGETS] is None:
+            if entry[_MOVES] is None:
+                entry[_MOVES] = list(board.legal_moves)
+            targets = [0] * 64
+            for move in entry[_MOVES]:
+                if not isinstance(move, VariantMove):
+                    targets[move.from_square] |= chess.BB_SQUARES[move.to_square]
+            entry[_TARGETS] = targets
+        return entry[_TARGETS][square]
+
+
+# One cache per process, used by Game and Engine unless they are given their
+# own. aiChess runs its engine in a worker process, so there only the board's
+# move highlighting uses it; selfplay gives each game's Game and Engine one
+# cache between them.
+shared_cache = PositionCache()
@@ -0,0 +1,75 @@
+import queue
+import socket
+import threading
+
+import chess
+
+from variant import parse_move
+
+
+class NetworkPlayer:
+    """UI-side connection to server.py. Nothing here blocks on the network.
+
+    Like EngineWorker, *notify* is called from a reader thread whenever the
+    server says something, and poll() hands the messages to the UI thread.
+    """
+
+    def __init__(self, host, port, notify=None):
+        self._socket = socket.create_connection((host, port))
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._notify = notify
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+        self.color = None  # set once a game starts
+
+    def _read(self):
+        with self._socket.makefile("r") as lines:
+            for line in lines:
+                self._lines.put(line.split())
+                if self._notify is not None:
+                    self._notify()
+        self._lines.put(["closed"])
+        if self._notify is not None:
+            self._notify()
+
+    def _send(self, line):
+        self._socket.sendall((line + "\n").encode())
+
+    def seek(self):
+        self.color = None
+        self._send("seek")
+
+    def move(self, move):
+        # The move is only played once the server echoes it back.
+        self._send(f"move {move.uci()}")
+
+    def resign(self):
+        self._send("resign")
+
+    def poll(self):
+        # Returns the next message as ("start", color), ("moved", ply, move),
+        # ("illegal", uci), ("end", result, termination) or ("closed",), or
+        # None if there is none.
+        while True:
+            try:
+                tokens = self._lines.get_nowait()
+            except queue.Empty:
+                return None
+            if tokens[0] == "start":
+                self.color = chess.WHITE if tokens[2] == "w" else chess.BLACK
+                return "start", self.color
+            elif tokens[0] == "moved":
+                return "moved", int(tokens[1]), parse_move(tokens[2])
+            elif tokens[0] == "illegal":
+                return "illegal", tokens[1]
+            elif tokens[0] == "end":
+                return "end", tokens[1], tokens[2]
+            elif tokens[0] == "closed":
+                return ("closed",)
+
+    def close(self):
+        try:
+            self._send("quit")
+            self._socket.close()
+        except OSError:
+            pass
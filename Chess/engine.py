@@ -0,0 +1,471 @@
+import time
+
+import chess
+
+from cache import shared_cache
+from variant import VariantMove, TELEPORT
+
+MATE_SCORE = 100000
+MATE_BOUND = MATE_SCORE - 1000
+MAX_PLY = 64
+
+# The clock is read every this many nodes (a power of two, minus one, as a mask).
+TIME_CHECK_MASK = 127
+
+# Quiescence searches every evasion only this many plies deep; a check after
+# that is treated like a quiet position. Captures that can't lift the score
+# within DELTA_MARGIN of alpha, or that lose material on the exchange, are
+# skipped.
+QUIESCE_CHECK_PLIES = 2
+DELTA_MARGIN = 200
+
+# Indexed by piece type (None, pawn, knight, bishop, rook, queen, king).
+PIECE_VALUES = [0, 100, 320, 330, 500, 900, 0]
+# The same for exchanges, where losing the king ends any sequence.
+EXCHANGE_VALUES = PIECE_VALUES[:chess.KING] + [20000]
+
+# Variant terms: an unused teleport is a small asset while the queen is alive,
+# and knights on cooldown are worth a little less for every ply left.
+TELEPORT_BONUS = 35
+COOLDOWN_PENALTY = 8
+
+# Piece-square tables from White's point of view, written rank 8 first.
+PST = [
+    None,
+    [  # pawn
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    [  # knight
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    [  # bishop
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    [  # rook
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ],
+    [  # queen
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    [  # king
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ],
+]
+
+# Transposition table bound types.
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+def evaluate(board):
+    # Static evaluation in centipawns from the side to move's point of view.
+    score = 0
+    for piece_type in range(chess.PAWN, chess.KING + 1):
+        value = PIECE_VALUES[piece_type]
+        table = PST[piece_type]
+        for square in chess.scan_forward(board.pieces_mask(piece_type, chess.WHITE)):
+            score += value + table[square ^ 56]
+        for square in chess.scan_forward(board.pieces_mask(piece_type, chess.BLACK)):
+            score -= value + table[square]
+
+    for color, sign in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        if not board.teleport_used[color] and board.pieces_mask(chess.QUEEN, color):
+            score += sign * TELEPORT_BONUS
+        score -= sign * COOLDOWN_PENALTY * board.knight_cooldown[color]
+
+    return score if board.turn == chess.WHITE else -score
+
+
+def static_exchange(board, move):
+    """Material *move* wins if both sides then keep recapturing on its target
+    square with their least valuable piece, stopping when it stops paying.
+
+    A double jump's first capture on the via square counts as part of the
+    move; recaptures are standard captures only.
+    """
+    captured = board.captured_pieces(move)
+    if not captured:
+        return 0
+    square = move.to_square
+    occupied = board.occupied & ~chess.BB_SQUARES[move.from_square]
+    if isinstance(move, VariantMove):
+        occupied &= ~chess.BB_SQUARES[move.via]
+    elif board.is_en_passant(move):
+        occupied &= ~chess.BB_SQUARES[board.ep_square + (-8 if board.turn == chess.WHITE else 8)]
+    gains = [sum(PIECE_VALUES[piece.piece_type] for piece in captured)]
+    piece_type = board.piece_type_at(move.from_square)
+    if move.promotion:
+        gains[0] += PIECE_VALUES[move.promotion] - PIECE_VALUES[chess.PAWN]
+        piece_type = move.promotion
+    color = not board.turn
+    while True:
+        attackers = board.attackers_mask(color, square, occupied) & occupied
+        if not attackers:
+            break
+        for attacker_type in range(chess.PAWN, chess.KING + 1):
+            ours = attackers & board.pieces_mask(attacker_type, color)
+            if ours:
+                break
+        gains.append(EXCHANGE_VALUES[piece_type] - gains[-1])
+        occupied &= ~chess.BB_SQUARES[chess.lsb(ours)]
+        piece_type = attacker_type
+        color = not color
+    # Either side may decline to recapture.
+    while len(gains) > 1:
+        last = gains.pop()
+        gains[-1] = -max(-gains[-1], last)
+    return gains[0]
+
+
+class TranspositionTable:
+    """Fixed-size, Zobrist-indexed table.
+
+    An entry is replaced when the new result is at least as deep, or when it
+    was left over from an earlier search.
+    """
+
+    def __init__(self, size=1 << 18):
+        # Round down to a power of two so the index is a single mask.
+        self.size = 1 << (max(size, 1).bit_length() - 1)
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        self.entries = [None] * self.size
+
+    def get(self, key):
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            self.entries[index] = (key, depth, score, flag, move, self.generation)
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class Engine:
+    """Iterative-deepening alpha-beta search for VariantBoard positions.
+
+    An optional opening *book* and *endgame* table (see book.py) are probed
+    before searching; a hit is played without spending any time.
+    """
+
+    def __init__(self, time_limit=1.0, max_depth=MAX_PLY, tt_size=1 << 18, cache=None, book=None, endgame=None):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.tt = TranspositionTable(tt_size)
+        # Legal move lists survive between iterations and searches here.
+        self.cache = shared_cache if cache is None else cache
+        self.book = book
+        self.endgame = endgame
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self._deadline = 0.0
+        self._soft_deadline = 0.0
+        self._stop = False
+        self._root_move = None
+        self._killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self._history = {}
+
+    def stop(self):
+        # Safe to call from another thread; the search returns its best move so far.
+        self._stop = True
+
+    def set_time_limit(self, time_limit):
+        # Also turns a running ponder search into a timed one.
+        now = time.perf_counter()
+        self._deadline = now + time_limit
+        # The next iteration costs several times the last one; don't start what can't finish.
+        self._soft_deadline = now + time_limit / 2
+
+    def search(self, board, time_limit=None, max_depth=None, callback=None, ponder=False):
+        """Returns the best move found within the time budget.
+
+        *callback* is called as ``callback(depth, score, move)`` after every
+        completed iteration. A *ponder* search has no deadline until
+        ``set_time_limit`` or ``stop`` is called.
+        """
+        time_limit = self.time_limit if time_limit is None else time_limit
+        max_depth = self.max_depth if max_depth is None else max_depth
+
+        moves = list(board.legal_moves)
+        if not moves:
+            return None
+
+        if ponder:
+            self._deadline = self._soft_deadline = float("inf")
+        else:
+            self.set_time_limit(time_limit)
+        self._stop = False
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self._killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self._history = {}
+        self.tt.new_search()
+
+        if self.book is not None:
+            move = self.book.choose(board)
+            if move is not None:
+                return move
+        if self.endgame is not None:
+            entry = self.endgame.probe(board)
+            if entry is not None:
+                self.depth = entry.depth
+                self.score = entry.value
+                if callback is not None:
+                    callback(entry.depth, entry.value, entry.move)
+                return entry.move
+
+        board = board.copy()
+        best_move = moves[0]
+        for depth in range(1, max_depth + 1):
+            try:
+                score, move = self._search_root(board, moves, depth)
+            except SearchTimeout:
+                # A root move that finished searching has beaten the ones before it,
+                # the previous best among them, so it is at least as good a pick.
+                if self._root_move is not None:
+                    best_move = self._root_move
+                break
+            best_move = move
+            self.depth = depth
+            self.score = score
+            if callback is not None:
+                callback(depth, score, move)
+            if len(moves) == 1 or abs(score) >= MATE_BOUND:
+                break
+            if time.perf_counter() > self._soft_deadline:
+                break
+
+        return best_move
+
+    def principal_variation(self, board, length=8):
+        # Follows best moves through the transposition table.
+        board = board.copy()
+        pv = []
+        for _ in range(length):
+            entry = self.tt.get(board.zobrist_hash())
+            if entry is None or entry[4] is None or not board.is_legal(entry[4]):
+                break
+            pv.append(entry[4])
+            board.push(entry[4])
+        return pv
+
+    def _check_time(self):
+        if self._stop or time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+
+    def _search_root(self, board, moves, depth):
+        entry = self.tt.get(board.zobrist_hash())
+        moves.sort(key=lambda move: self._order_score(board, move, entry and entry[4], 0), reverse=True)
+
+        alpha, beta = -MATE_SCORE, MATE_SCORE
+        best_move = moves[0]
+        self._root_move = None
+        for move in moves:
+            board.push(move)
+            score = -self._negamax(board, depth - 1, -beta, -alpha, 1)
+            board.pop()
+            if score > alpha:
+                alpha = score
+                best_move = self._root_move = move
+
+        # Keep the best move first for the next iteration.
+        moves.remove(best_move)
+        moves.insert(0, best_move)
+        self.tt.store(board.zobrist_hash(), depth, alpha, EXACT, best_move)
+        return alpha, best_move
+
+    def _negamax(self, board, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & TIME_CHECK_MASK:
+            self._check_time()
+
+        if board.halfmove_clock >= 100 or board.is_repetition(2):
+            return 0
+
+        in_check = board.is_check()
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiesce(board, alpha, beta, ply)
+
+        key = board.zobrist_hash()
+        alpha_orig = alpha
+        tt_move = None
+        entry = self.tt.get(key)
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                score = _score_from_tt(entry[2], ply)
+                if entry[3] == EXACT:
+                    return score
+                elif entry[3] == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        moves = self.cache.legal_moves(board, key)
+        if not moves:
+            return -MATE_SCORE + ply if in_check else 0
+        moves = sorted(moves, key=lambda move: self._order_score(board, move, tt_move, ply), reverse=True)
+
+        best_score = -MATE_SCORE
+        best_move = None
+        for move in moves:
+            capture = board.is_capture(move)
+            board.push(move)
+            score = -self._negamax(board, depth - 1, -beta, -alpha, ply + 1)
+            board.pop()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if not capture:
+                    killers = self._killers[ply]
+                    if killers[0] != move:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                    history_key = (move.from_square, move.to_square)
+                    self._history[history_key] = self._history.get(history_key, 0) + depth * depth
+                break
+
+        if best_score <= alpha_orig:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, _score_to_tt(best_score, ply), flag, best_move)
+        return best_score
+
+    def _quiesce(self, board, alpha, beta, ply, qply=0):
+        self.nodes += 1
+        if not self.nodes & TIME_CHECK_MASK:
+            self._check_time()
+
+        stand_pat = None
+        if qply < QUIESCE_CHECK_PLIES and board.is_check():
+            # No standing pat in check; every evasion (teleport blocks included) is searched.
+            moves = list(board.legal_moves)
+            if not moves:
+                return -MATE_SCORE + ply
+            best_score = -MATE_SCORE
+        else:
+            best_score = stand_pat = evaluate(board)
+            if best_score >= beta or ply >= MAX_PLY:
+                return best_score
+            alpha = max(alpha, best_score)
+            moves = list(board.generate_legal_captures())
+        moves = sorted(moves, key=lambda move: self._order_score(board, move, None, ply), reverse=True)
+
+        for move in moves:
+            if stand_pat is not None and not move.promotion:
+                gain = sum(PIECE_VALUES[piece.piece_type] for piece in board.captured_pieces(move))
+                if stand_pat + gain + DELTA_MARGIN <= alpha or static_exchange(board, move) < 0:
+                    continue
+            board.push(move)
+            score = -self._quiesce(board, -beta, -alpha, ply + 1, qply + 1)
+            board.pop()
+            if score > best_score:
+                best_score = score
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return best_score
+
+    def _order_score(self, board, move, tt_move, ply):
+        if move == tt_move:
+            return 1000000
+        captured = board.captured_pieces(move)
+        if captured:
+            # MVV-LVA; a double jump that takes twice sorts above a single capture.
+            victims = sum(PIECE_VALUES[piece.piece_type] for piece in captured)
+            attacker = board.piece_type_at(move.from_square)
+            return 100000 + 10 * victims - PIECE_VALUES[attacker]
+        if move.promotion:
+            return 90000 + PIECE_VALUES[move.promotion]
+        if ply <= MAX_PLY and move in self._killers[ply]:
+            return 80000
+        score = self._history.get((move.from_square, move.to_square), 0)
+        # Spend the one-off teleport and the double jump late unless they prove themselves.
+        if isinstance(move, VariantMove):
+            score -= 1000 if move.kind == TELEPORT else 500
+        return score
+
+
+def _score_to_tt(score, ply):
+    # Mate scores are stored relative to the node, not the root.
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
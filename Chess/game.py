@@ -0,0 +1,203 @@
+import re
+
+import chess
+
+from cache import shared_cache
+from variant import VariantBoard, VariantMove, TELEPORT
+
+VARIANT_NAME = "Teleport/Double-Jump"
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+_TAG_REGEX = re.compile(r'^\[(\w+)\s+"(.*)"\]$')
+# Movetext tokens: comment and variation delimiters, NAGs, and everything else.
+_MOVETEXT_REGEX = re.compile(r"[{}();]|\$\d+|[^\s{}();]+")
+
+
+class Game:
+    """Headless state of one game: the board plus what each side has lost.
+
+    Both the pygame front end and the self-play runner drive games through
+    this class, so the rules never depend on a window.
+    """
+
+    def __init__(self, fen=chess.STARTING_FEN, cache=None):
+        self.board = VariantBoard(fen)
+        self.cache = shared_cache if cache is None else cache
+        # Symbols of captured pieces, split by the color of the piece taken.
+        self.captured_white = []
+        self.captured_black = []
+        # Pieces taken by each move on the board's stack, and moves taken back.
+        self._capture_counts = []
+        self._redo = []
+
+    def copy(self, stack=True):
+        # With stack=False the copy starts from the current position, which
+        # is all a replay checkpoint needs.
+        game = type(self)(None, self.cache)
+        game.board = self.board.copy(stack=stack)
+        game.captured_white = list(self.captured_white)
+        game.captured_black = list(self.captured_black)
+        if stack:
+            game._capture_counts = list(self._capture_counts)
+        return game
+
+    def reset(self):
+        self.board.reset()
+        self.captured_white.clear()
+        self.captured_black.clear()
+        self._capture_counts.clear()
+        self._redo.clear()
+
+    @property
+    def turn(self):
+        return self.board.turn
+
+    def legal_targets(self, square):
+        return chess.SquareSet(self.cache.legal_targets_mask(self.board, square))
+
+    def teleport_targets(self, square):
+        return chess.SquareSet(self.board.teleport_targets_mask(square))
+
+    def double_jump_vias(self, square):
+        return chess.SquareSet(self.board.double_jump_vias_mask(square))
+
+    def double_jump_targets(self, square, via):
+        return chess.SquareSet(self.board.double_jump_targets_mask(square, via))
+
+    def play(self, move):
+        if not self.board.is_legal(move):
+            raise chess.IllegalMoveError(f"illegal move: {move.uci()} in {self.board.fen()}")
+        self._redo.clear()
+        self._push(move)
+
+    def _push(self, move):
+        captured = self.board.captured_pieces(move)
+        (self.captured_black if self.board.turn else self.captured_white).extend(
+            piece.symbol() for piece in captured)
+        self._capture_counts.append(len(captured))
+        self.board.push(move)
+
+    def undo(self):
+        # Takes back the last move and returns it, or None at the start. Undo
+        # is a pop on the board, so it costs the same however long the game.
+        if not self._capture_counts:
+            return None
+        move = self.board.pop()
+        count = self._capture_counts.pop()
+        if count:
+            del (self.captured_black if self.board.turn else self.captured_white)[-count:]
+        self._redo.append(move)
+        return move
+
+    def redo(self):
+        # Replays the last move taken back, until another move is played.
+        if not self._redo:
+            return None
+        move = self._redo.pop()
+        self._push(move)
+        return move
+
+    def is_over(self):
+        return self.board.is_game_over()
+
+    def result(self):
+        return self.board.result()
+
+    def pgn(self, headers=None, result=None, termination=None):
+        # Variant moves are written in the board's own SAN ("Qd1~h5",
+        # "Nb1-c3xd5") and annotated with their UCI form so readers that only
+        # know standard chess can still replay them.
+        board = self.board.root()
+        result = self.result() if result is None else result
+        tags = {"Event": "?", "Site": "?", "Date": "????.??.??", "Round": "?",
+                "White": "?", "Black": "?", "Result": result, "Variant": VARIANT_NAME}
+        if board.fen() != chess.STARTING_FEN:
+            tags["SetUp"] = "1"
+            tags["FEN"] = board.fen()
+        if termination is not None:
+            tags["Termination"] = termination
+        if headers:
+            tags.update(headers)
+
+        tokens = []
+        for move in self.board.move_stack:
+            if board.turn == chess.WHITE:
+                tokens.append(f"{board.fullmove_number}.")
+            elif not tokens or tokens[-1].startswith("{"):
+                tokens.append(f"{board.fullmove_number}...")
+            tokens.append(board.san(move))
+            if isinstance(move, VariantMove):
+                kind = "teleport" if move.kind == TELEPORT else "jump"
+                tokens.append(f"{{[%{kind} {move.uci()}]}}")
+            board.push(move)
+        tokens.append(result)
+
+        lines = [f'[{name} "{value}"]' for name, value in tags.items()]
+        lines.append("")
+        line = ""
+        for token in tokens:
+            if line and len(line) + 1 + len(token) > 79:
+                lines.append(line)
+                line = token
+            else:
+                line = f"{line} {token}" if line else token
+        lines.append(line)
+        return "\n".join(lines) + "\n"
+
+
+def read_pgn(lines):
+    """Yields a (headers, Game) pair for every game in PGN text.
+
+    Reads what Game.pgn() writes, and standard games too. Comments,
+    variations, NAGs, move annotations and escaped lines are skipped;
+    variant moves are read from their SAN.
+
+    >>> text = '1. e4 $1 e5 (1... c5 {Sicilian} (1... e6) 2. Nf3) 2. Nf3! ; main line\\n% escaped\\n1-0\\n'
+    >>> for headers, game in read_pgn(text.splitlines()):
+    ...     print(" ".join(move.uci() for move in game.board.move_stack))
+    e2e4 e7e5 g1f3
+    """
+    headers = {}
+    tokens = []
+    in_comment = False
+    variation_depth = 0
+    for line in lines:
+        line = line.strip()
+        if line.startswith("%") and not in_comment:
+            continue
+        match = _TAG_REGEX.match(line)
+        if match and not tokens and not in_comment:
+            headers[match.group(1)] = match.group(2)
+            continue
+        for token in _MOVETEXT_REGEX.findall(line):
+            # Comments may span lines and variations may nest.
+            if in_comment:
+                in_comment = token != "}"
+                continue
+            if token == "{":
+                in_comment = True
+                continue
+            if token == ";":
+                break
+            if token == "(":
+                variation_depth += 1
+                continue
+            if token == ")":
+                variation_depth = max(variation_depth - 1, 0)
+                continue
+            if variation_depth or token.startswith("$"):
+                continue
+            token = token.rstrip("!?")
+            if not token:
+                continue
+            tokens.append(token)
+            if token in RESULTS:
+                game = Game(headers.get("FEN", chess.STARTING_FEN))
+                for san in tokens[:-1]:
+                    san = re.sub(r"^\d+\.+", "", san)
+                    if san:
+                        game.play(game.board.parse_san(san))
+                yield headers, game
+                headers = {}
+                tokens = []
+                variation_depth = 0
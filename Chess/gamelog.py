@@ -0,0 +1,244 @@
+import argparse
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+from book import encode_move, decode_move
+from game import Game, RESULTS
+from variant import VariantBoard, pack_state, unpack_state
+
+# Finished games are appended to two files: PGN for people and other tools,
+# and a compact binary log (3 bytes per move) for replays. Writing happens on
+# a background thread, so logging a game never stalls the window. Example:
+#
+#   python gamelog.py games.vgl                    # list the logged games
+#   python gamelog.py games.vgl --game 3 --ply 40  # show a position
+#   python gamelog.py games.vgl --pgn              # the whole log as PGN
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+PGN_FILE = os.path.join(ASSET_DIR, "games.pgn")
+LOG_FILE = os.path.join(ASSET_DIR, "games.vgl")
+
+MAGIC = b"VGL1"
+GAME = struct.Struct(">BBHI")  # result, variant state of the start position, FEN length, move count
+MOVE_SIZE = 3  # book.encode_move() needs 23 bits
+CHECKPOINT_INTERVAL = 16
+
+
+class GameLog:
+    """Append-only game log written by a background thread.
+
+    append() only queues the start position and the moves; the game is
+    replayed and its PGN text and binary record are built on the thread.
+    Both files are opened in append mode with large buffers when the first
+    game is written, so a session without games leaves no files behind,
+    and flushed once per game.
+    """
+
+    def __init__(self, pgn_path=PGN_FILE, log_path=LOG_FILE, buffer_size=1 << 16):
+        self.pgn_path = pgn_path
+        self.log_path = log_path
+        self.buffer_size = buffer_size
+        self._pgn = None
+        self._log = None
+        self._opened = False
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def append(self, game, headers=None, result=None, termination=None):
+        headers = dict(headers or {})
+        headers.setdefault("Date", time.strftime("%Y.%m.%d"))
+        # Board.copy() with its stack costs more than replaying the moves later.
+        self._queue.put((game.board.root(), list(game.board.move_stack), headers, result, termination))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if not self._opened:
+                self._open()
+            board, moves, headers, result, termination = item
+            game = _replayed(board, moves)
+            result = game.result() if result is None else result
+            if self._pgn is not None:
+                self._pgn.write(game.pgn(headers, result, termination) + "\n")
+                self._pgn.flush()
+            if self._log is not None:
+                self._log.write(encode_game(game.board, result))
+                self._log.flush()
+
+    def _open(self):
+        self._opened = True
+        if self.pgn_path:
+            self._pgn = open(self.pgn_path, "a", buffering=self.buffer_size)
+        if self.log_path:
+            self._log = open(self.log_path, "ab", buffering=self.buffer_size)
+            if self._log.tell() == 0:
+                self._log.write(MAGIC)
+
+    def close(self):
+        # Waits for the queued games to be written.
+        self._queue.put(None)
+        self._thread.join()
+        for f in (self._pgn, self._log):
+            if f is not None:
+                f.close()
+
+
+def _replayed(board, moves):
+    game = Game(None)
+    game.board = board
+    for move in moves:
+        game._push(move)
+    return game
+
+
+def encode_game(board, result):
+    root = board.root()
+    fen = root.fen().encode()
+    data = bytearray(GAME.pack(RESULTS.index(result), pack_state(root.teleport_used, root.knight_cooldown),
+                               len(fen), len(board.move_stack)))
+    data += fen
+    for move in board.move_stack:
+        data += encode_move(move).to_bytes(MOVE_SIZE, "big")
+    return bytes(data)
+
+
+class LoggedGame:
+    def __init__(self, result, fen, state, moves):
+        self.result = result
+        self.fen = fen
+        self.state = state
+        self.moves = moves
+
+    def start(self):
+        board = VariantBoard(self.fen)
+        board.teleport_used, board.knight_cooldown = unpack_state(self.state)
+        return board
+
+    def replay(self, interval=CHECKPOINT_INTERVAL):
+        return Replay(self.start(), self.moves, interval)
+
+
+def read_log(path):
+    # Yields a LoggedGame for every game in a binary log. Moves stay encoded
+    # until a game is replayed, so skimming a large log is cheap.
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"not a game log: {path}")
+    offset = len(MAGIC)
+    while offset + GAME.size <= len(data):
+        result, state, fen_length, count = GAME.unpack_from(data, offset)
+        offset += GAME.size
+        fen = data[offset:offset + fen_length].decode()
+        offset += fen_length
+        moves = _MoveList(data[offset:offset + count * MOVE_SIZE])
+        offset += count * MOVE_SIZE
+        if len(moves) != count:
+            break  # cut short by a crash while writing
+        yield LoggedGame(RESULTS[result], fen, state, moves)
+
+
+class _MoveList:
+    # Read-only sequence of moves decoded on access.
+
+    def __init__(self, data):
+        self._data = data
+
+    def __len__(self):
+        return len(self._data) // MOVE_SIZE
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return decode_move(int.from_bytes(self._data[index * MOVE_SIZE:(index + 1) * MOVE_SIZE], "big"))
+
+
+class Replay:
+    """Random access to the positions of a finished game.
+
+    A copy of the game is kept every *interval* plies, so seek() copies the
+    nearest checkpoint and plays at most interval - 1 moves instead of
+    replaying from the first move.
+    """
+
+    def __init__(self, board, moves, interval=CHECKPOINT_INTERVAL):
+        self.moves = list(moves)
+        self.interval = interval
+        game = Game(None)
+        game.board = board.copy(stack=False)
+        self._checkpoints = []
+        for ply, move in enumerate(self.moves):
+            if ply % interval == 0:
+                self._checkpoints.append(game.copy(stack=False))
+            game._push(move)
+        if len(self.moves) % interval == 0:
+            self._checkpoints.append(game.copy(stack=False))
+
+    @classmethod
+    def from_game(cls, game, interval=CHECKPOINT_INTERVAL):
+        return cls(game.board.root(), game.board.move_stack, interval)
+
+    def __len__(self):
+        # Number of plies; seek() takes 0 through len(replay).
+        return len(self.moves)
+
+    def seek(self, ply):
+        # A new Game at *ply*, with the moves since the checkpoint on its stack.
+        ply = max(0, min(ply, len(self.moves)))
+        game = self._checkpoints[ply // self.interval].copy(stack=False)
+        for move in self.moves[ply - ply % self.interval:ply]:
+            game._push(move)
+        return game
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect a binary game log.")
+    parser.add_argument("log", nargs="?", default=LOG_FILE)
+    parser.add_argument("--game", type=int, help="game number, from 1")
+    parser.add_argument("--ply", type=int, help="show the position after this many plies")
+    parser.add_argument("--pgn", action="store_true", help="print the games as PGN")
+    args = parser.parse_args(argv)
+
+    try:
+        games = list(read_log(args.log))
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.game is not None:
+        if not 1 <= args.game <= len(games):
+            print(f"no game {args.game}; the log has {len(games)}", file=sys.stderr)
+            return 1
+        selected = [(args.game, games[args.game - 1])]
+    else:
+        selected = list(enumerate(games, 1))
+
+    for number, logged in selected:
+        if args.pgn:
+            game = _replayed(logged.start(), logged.moves)
+            print(game.pgn({"Round": str(number)}, logged.result))
+        elif args.ply is not None:
+            start = time.perf_counter()
+            game = logged.replay().seek(args.ply)
+            elapsed = time.perf_counter() - start
+            print(f"game {number}, ply {min(args.ply, len(logged.moves))} of {len(logged.moves)} "
+                  f"(replayed in {elapsed * 1000:.2f} ms)")
+            print(game.board)
+            print(game.board.fen())
+        else:
+            print(f"{number:5}  {logged.result:8} {len(logged.moves):4} plies  {logged.fen}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+from variant import VariantBoard, parse_move
+
+# Plays many random games against server.py at once and reports how fast they
+# finish and how long each move takes to come back. Example:
+#
+#   python loadtest.py --games 500 --concurrency 100     # starts its own server
+#   python loadtest.py --server localhost:8765
+
+
+async def play_client(host, port, rng, max_plies, latencies):
+    # One player: seeks a game, answers every turn with a random legal move
+    # and resigns after *max_plies*. Returns the result.
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b"seek\n")
+    board = VariantBoard()
+    color = None
+    sent_at = None
+    result = None
+    while result is None:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        tokens = line.decode().split()
+        if tokens[0] == "start":
+            color = tokens[2] == "w"
+        elif tokens[0] == "moved":
+            if sent_at is not None:
+                latencies.append(time.perf_counter() - sent_at)
+                sent_at = None
+            board.push(parse_move(tokens[2]))
+        elif tokens[0] == "end":
+            result = tokens[1]
+            break
+        else:
+            raise RuntimeError(f"unexpected reply: {line.decode().strip()}")
+
+        # After the last move the server follows up with "end"; wait for it.
+        if board.turn == color and sent_at is None and not board.is_game_over():
+            if len(board.move_stack) >= max_plies:
+                writer.write(b"resign\n")
+            else:
+                move = rng.choice(list(board.legal_moves))
+                sent_at = time.perf_counter()
+                writer.write(f"move {move.uci()}\n".encode())
+            await writer.drain()
+
+    writer.write(b"quit\n")
+    writer.close()
+    return result
+
+
+async def run(host, port, games, concurrency, max_plies, seed):
+    latencies = []
+    results = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def play_pair(index):
+        async with slots:
+            rng = random.Random(seed * 1000003 + index)
+            pair = await asyncio.gather(play_client(host, port, rng, max_plies, latencies),
+                                        play_client(host, port, rng, max_plies, latencies))
+            results.extend(pair)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play_pair(index) for index in range(games)))
+    return time.perf_counter() - start, latencies, results
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test for the network play server.")
+    parser.add_argument("--server", metavar="HOST:PORT", help="server to use (default: start one)")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="games in progress at once")
+    parser.add_argument("--plies", type=int, default=60, help="resign after this many plies")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    process = None
+    if args.server:
+        address = args.server
+    else:
+        # A separate process, so the clients don't compete with it for the GIL.
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+        process = subprocess.Popen([sys.executable, script, "--host", "127.0.0.1", "--port", "0"],
+                                   stdout=subprocess.PIPE, text=True)
+        address = process.stdout.readline().split()[-1]
+    host, port = address.rsplit(":", 1)
+
+    try:
+        elapsed, latencies, results = asyncio.run(run(host, int(port), args.games, args.concurrency, args.plies,
+                                                      args.seed))
+    finally:
+        if process is not None:
+            process.kill()
+
+    games = len(results) // 2
+    latencies.sort()
+    print(f"Games: {games} in {elapsed:.2f}s ({games / elapsed:.1f} games/s), "
+          f"{len(latencies)} moves ({len(latencies) / elapsed:.0f} moves/s)")
+    if latencies:
+        print("Move latency (ms): " + "  ".join(
+            f"p{int(fraction * 100)} {percentile(latencies, fraction) * 1000:.2f}"
+            for fraction in (0.5, 0.9, 0.99)) + f"  max {latencies[-1] * 1000:.2f}")
+
+
+if __name__ == "__main__":
+    main()
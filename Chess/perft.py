@@ -0,0 +1,201 @@
+import argparse
+import json
+import sys
+import time
+
+import chess
+
+from variant import VariantBoard, VariantMove
+
+# Perft counts the leaf nodes of the legal move tree to a fixed depth. The
+# standard suite checks python-chess itself against the published numbers;
+# the variant suite checks VariantBoard with teleports and double jumps in
+# play. Example:
+#
+#   python perft.py                       # validate both suites
+#   python perft.py --save timings.json   # record nodes/sec
+#   python perft.py --compare timings.json --tolerance 0.15
+
+# (name, fen, teleport_used, knight_cooldown, [nodes at depth 1, 2, ...]).
+# teleport_used and knight_cooldown are indexed by color, Black first.
+STANDARD_POSITIONS = [
+    ("start", chess.STARTING_FEN, None, None, [20, 400, 8902, 197281]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", None, None,
+     [48, 2039, 97862]),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", None, None, [14, 191, 2812, 43238]),
+    ("promotions", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", None, None,
+     [6, 264, 9467]),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", None, None, [44, 1486, 62379]),
+]
+
+VARIANT_POSITIONS = [
+    ("start", chess.STARTING_FEN, (False, False), (0, 0), [68, 4598, 267377]),
+    ("teleports used", chess.STARTING_FEN, (True, True), (0, 0), [36, 1290, 42559]),
+    ("knights on cooldown", "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+     (False, False), (1, 3), [65, 6885, 339376]),
+    ("teleport block", "4k3/8/8/8/8/8/8/r3K2Q w - - 0 1", (False, False), (0, 0), [6, 97, 4750]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     (False, False), (0, 0), [134, 14585, 1479173]),
+]
+
+SUITES = {"standard": STANDARD_POSITIONS, "variant": VARIANT_POSITIONS}
+
+
+def make_board(fen, teleport_used, knight_cooldown):
+    if teleport_used is None:
+        return chess.Board(fen)
+    board = VariantBoard(fen)
+    board.teleport_used = list(teleport_used)
+    board.knight_cooldown = list(knight_cooldown)
+    return board
+
+
+def perft(board, depth):
+    if depth == 0:
+        return 1
+    moves = list(board.legal_moves)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def divide(board, depth):
+    # Per-move counts, for finding where two generators disagree.
+    counts = {}
+    for move in list(board.legal_moves):
+        board.push(move)
+        counts[move.uci()] = perft(board, depth - 1)
+        board.pop()
+    return counts
+
+
+def reference_variant_moves(board):
+    # Slow, independent generator for the house-rule moves: it edits plain
+    # chess.Board copies and asks python-chess whether the king is attacked.
+    moves = set()
+    us = board.turn
+    if not board.teleport_used[us]:
+        for queen in board.pieces(chess.QUEEN, us):
+            for square in chess.SQUARES:
+                if board.piece_at(square) is None:
+                    after = chess.Board(board.fen())
+                    after.remove_piece_at(queen)
+                    after.set_piece_at(square, chess.Piece(chess.QUEEN, us))
+                    king = after.king(us)
+                    if king is None or not after.is_attacked_by(not us, king):
+                        moves.add(VariantMove.teleport(queen, square))
+    if not board.knight_cooldown[us]:
+        for knight in board.pieces(chess.KNIGHT, us):
+            after = chess.Board(board.fen())
+            for first in list(after.generate_legal_moves(chess.BB_SQUARES[knight])):
+                after.push(first)
+                after.turn = us
+                after.ep_square = None
+                for second in after.generate_legal_moves(chess.BB_SQUARES[first.to_square], ~after.kings):
+                    moves.add(VariantMove.double_jump(knight, first.to_square, second.to_square))
+                after.turn = not us
+                after.pop()
+    return moves
+
+
+def check_reference(board, depth):
+    # Compares the variant moves with the reference generator at every node
+    # down to *depth*. Returns the FEN of the first mismatch, if any.
+    generated = set(board.generate_variant_moves())
+    if generated != reference_variant_moves(board):
+        return board.fen()
+    if depth > 1:
+        for move in list(board.legal_moves):
+            board.push(move)
+            mismatch = check_reference(board, depth - 1)
+            board.pop()
+            if mismatch:
+                return mismatch
+    return None
+
+
+def run_suite(name, positions, max_depth, reference_depth):
+    results = []
+    failures = 0
+    for position, fen, teleport_used, knight_cooldown, expected in positions:
+        board = make_board(fen, teleport_used, knight_cooldown)
+        for depth, nodes_expected in enumerate(expected[:max_depth], 1):
+            start = time.perf_counter()
+            nodes = perft(board, depth)
+            elapsed = time.perf_counter() - start
+            nps = nodes / elapsed if elapsed > 0 else 0.0
+            status = "ok" if nodes == nodes_expected else f"FAIL (expected {nodes_expected})"
+            failures += nodes != nodes_expected
+            print(f"{name:8} {position:20} depth {depth}  {nodes:>9} nodes  {nps:>9.0f} nodes/s  {status}")
+            results.append({"suite": name, "position": position, "depth": depth, "nodes": nodes, "nps": nps})
+
+        if reference_depth and teleport_used is not None:
+            mismatch = check_reference(board, reference_depth)
+            failures += mismatch is not None
+            print(f"{name:8} {position:20} reference to depth {reference_depth}  "
+                  + ("ok" if mismatch is None else f"FAIL at {mismatch}"))
+    return results, failures
+
+
+def compare(results, baseline, tolerance):
+    # Flags positions whose speed dropped by more than *tolerance* (a fraction).
+    previous = {(r["suite"], r["position"], r["depth"]): r["nps"] for r in baseline}
+    regressions = 0
+    for result in results:
+        old = previous.get((result["suite"], result["position"], result["depth"]))
+        # Very short runs are too noisy to judge.
+        if not old or result["nodes"] < 1000:
+            continue
+        change = result["nps"] / old - 1
+        if change < -tolerance:
+            regressions += 1
+            print(f"REGRESSION {result['suite']} {result['position']} depth {result['depth']}: "
+                  f"{old:.0f} -> {result['nps']:.0f} nodes/s ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft validation and move generation benchmark.")
+    parser.add_argument("--suite", choices=["standard", "variant", "all"], default="all")
+    parser.add_argument("--depth", type=int, default=3, help="maximum depth per position")
+    parser.add_argument("--reference", type=int, default=1,
+                        help="also check variant moves against the slow reference generator to this depth")
+    parser.add_argument("--divide", metavar="FEN", help="print per-move counts for a variant position and exit")
+    parser.add_argument("--save", metavar="FILE", help="write nodes/sec results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="fail if nodes/sec dropped against a saved run")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    if args.divide:
+        counts = divide(VariantBoard(args.divide), args.depth)
+        for uci, nodes in sorted(counts.items()):
+            print(f"{uci}: {nodes}")
+        print(f"total: {sum(counts.values())}")
+        return 0
+
+    suites = SUITES if args.suite == "all" else {args.suite: SUITES[args.suite]}
+    results = []
+    failures = 0
+    for name, positions in suites.items():
+        suite_results, suite_failures = run_suite(name, positions, args.depth, args.reference)
+        results += suite_results
+        failures += suite_failures
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            failures += compare(results, json.load(f), args.tolerance)
+
+    print("all passed" if not failures else f"{failures} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
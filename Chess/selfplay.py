@@ -0,0 +1,103 @@
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import chess
+
+from cache import PositionCache
+from engine import Engine
+from game import Game
+from variant import VariantMove, TELEPORT
+
+# Engine-vs-engine games without a window, for tuning the engine and balancing
+# the house rules. Example:
+#
+#   python selfplay.py --games 2000 --time 0.05 --depth 2 --output games.pgn
+
+
+def play_game(index, time_limit, max_depth, max_plies, random_plies, seed, cache_size):
+    rng = random.Random(seed * 1000003 + index)
+    cache = PositionCache(cache_size)
+    game = Game(cache=cache)
+    engine = Engine(time_limit=time_limit, max_depth=max_depth, tt_size=1 << 16, cache=cache)
+    stats = {
+        "teleports": [0, 0],  # indexed by color
+        "double_jumps": [0, 0],
+    }
+
+    termination = None
+    while not game.is_over():
+        if len(game.board.move_stack) >= max_plies:
+            termination = "max plies"
+            break
+        if len(game.board.move_stack) < random_plies:
+            # A few random opening moves keep the games from all being the same.
+            move = rng.choice(cache.legal_moves(game.board))
+        else:
+            move = engine.search(game.board)
+        if isinstance(move, VariantMove):
+            key = "teleports" if move.kind == TELEPORT else "double_jumps"
+            stats[key][game.turn] += 1
+        game.play(move)
+
+    headers = {"Event": "Self-play", "Round": str(index + 1),
+               "White": f"engine d{max_depth}", "Black": f"engine d{max_depth}"}
+    result = "*" if termination else game.result()
+    stats["plies"] = len(game.board.move_stack)
+    stats["result"] = result
+    return index, game.pgn(headers, result, termination), stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run engine-vs-engine games of the chess variant.")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per core)")
+    parser.add_argument("--time", type=float, default=0.05, help="seconds per move")
+    parser.add_argument("--depth", type=int, default=2, help="maximum search depth")
+    parser.add_argument("--max-plies", type=int, default=300)
+    parser.add_argument("--random-plies", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-size", type=int, default=1 << 14, help="positions kept in the move cache")
+    parser.add_argument("--output", default="selfplay.pgn")
+    args = parser.parse_args(argv)
+
+    results = {"1-0": 0, "0-1": 0, "1/2-1/2": 0, "*": 0}
+    teleports = [0, 0]
+    double_jumps = [0, 0]
+    plies = 0
+    start = time.perf_counter()
+
+    with open(args.output, "w") as out, ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(play_game, index, args.time, args.depth, args.max_plies, args.random_plies, args.seed,
+                               args.cache_size)
+                   for index in range(args.games)]
+        for done, future in enumerate(as_completed(futures), 1):
+            index, pgn, stats = future.result()
+            # Games are written as they finish, so a long run can be inspected (or killed) midway.
+            out.write(pgn + "\n")
+            out.flush()
+
+            results[stats["result"]] += 1
+            plies += stats["plies"]
+            for color in (chess.WHITE, chess.BLACK):
+                teleports[color] += stats["teleports"][color]
+                double_jumps[color] += stats["double_jumps"][color]
+            if done % 10 == 0 or done == args.games:
+                rate = done / (time.perf_counter() - start)
+                print(f"{done}/{args.games} games, {rate:.2f} games/s", file=sys.stderr)
+
+    games = max(args.games, 1)
+    elapsed = time.perf_counter() - start
+    print(f"Games: {args.games} in {elapsed:.1f}s ({args.games / elapsed:.2f} games/s)")
+    print(f"White wins: {results['1-0']}  Black wins: {results['0-1']}  "
+          f"Draws: {results['1/2-1/2']}  Unfinished: {results['*']}")
+    print(f"Average length: {plies / games:.1f} plies")
+    print(f"Teleports per game: White {teleports[chess.WHITE] / games:.2f}  Black {teleports[chess.BLACK] / games:.2f}")
+    print(f"Double jumps per game: White {double_jumps[chess.WHITE] / games:.2f}  "
+          f"Black {double_jumps[chess.BLACK] / games:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import itertools
+
+import chess
+
+from game import Game
+from variant import parse_move
+
+# Hosts any number of games over TCP. The server owns the board: moves are
+# validated here, teleports and double jumps included, and both players then
+# get just the move, never the whole position. One command per line:
+#
+#   seek                          (wait for the next player who seeks)
+#   move <uci>                    (variant forms: "d1~h5", "b1c3d5")
+#   resign
+#   quit
+#
+#   start <game> <w|b>
+#   moved <ply> <uci>             (sent to both players, including the mover)
+#   illegal <uci>
+#   end <result> <termination>
+#   error <message>
+#
+# Example:
+#
+#   python server.py --port 8765
+#   python loadtest.py --server localhost:8765
+
+
+class Player:
+    def __init__(self, writer):
+        self.writer = writer
+        self.match = None
+        self.color = None
+
+    def send(self, line):
+        self.writer.write((line + "\n").encode())
+
+
+class Match:
+    def __init__(self, match_id, white, black):
+        self.id = match_id
+        self.game = Game()
+        self.players = {chess.WHITE: white, chess.BLACK: black}
+        for color, player in self.players.items():
+            player.match = self
+            player.color = color
+            player.send(f"start {match_id} {'w' if color else 'b'}")
+
+    def broadcast(self, line):
+        for player in self.players.values():
+            player.send(line)
+
+
+class Server:
+    def __init__(self):
+        self.matches = {}
+        self._ids = itertools.count(1)
+        self._waiting = None
+        self.games_finished = 0
+        self.moves = 0
+
+    async def handle(self, reader, writer):
+        player = Player(writer)
+        try:
+            async for line in reader:
+                tokens = line.decode(errors="replace").split()
+                if not tokens:
+                    continue
+                command = tokens[0]
+                if command == "seek":
+                    self._seek(player)
+                elif command == "move" and len(tokens) == 2:
+                    self._move(player, tokens[1])
+                elif command == "resign":
+                    if player.match is not None:
+                        self._finish(player.match, "0-1" if player.color else "1-0", "resignation")
+                elif command == "quit":
+                    break
+                else:
+                    player.send(f"error unknown command: {line.decode(errors='replace').strip()}")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if self._waiting is player:
+                self._waiting = None
+            if player.match is not None:
+                self._finish(player.match, "0-1" if player.color else "1-0", "abandoned")
+            writer.close()
+
+    def _seek(self, player):
+        if player.match is not None:
+            player.send("error already playing")
+        elif self._waiting is None or self._waiting is player:
+            self._waiting = player
+        else:
+            opponent, self._waiting = self._waiting, None
+            match = Match(next(self._ids), opponent, player)
+            self.matches[match.id] = match
+
+    def _move(self, player, uci):
+        match = player.match
+        if match is None:
+            player.send("error not in a game")
+            return
+        if match.game.turn != player.color:
+            player.send(f"illegal {uci}")
+            return
+        try:
+            move = parse_move(uci)
+            match.game.play(move)
+        except ValueError:
+            # chess.InvalidMoveError and chess.IllegalMoveError
+            player.send(f"illegal {uci}")
+            return
+        self.moves += 1
+        match.broadcast(f"moved {len(match.game.board.move_stack)} {move.uci()}")
+        if match.game.is_over():
+            termination = match.game.board.outcome().termination.name.lower()
+            self._finish(match, match.game.result(), termination)
+
+    def _finish(self, match, result, termination):
+        match.broadcast(f"end {result} {termination}")
+        for player in match.players.values():
+            player.match = None
+        del self.matches[match.id]
+        self.games_finished += 1
+
+
+async def serve(host, port):
+    server = Server()
+    listener = await asyncio.start_server(server.handle, host, port)
+    host, port = listener.sockets[0].getsockname()[:2]
+    print(f"listening on {host}:{port}", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Network play server for the chess variant.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
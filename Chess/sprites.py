@@ -0,0 +1,73 @@
+import os
+
+import pygame
+
+# All twelve piece images packed into one PNG: white pieces on the top row,
+# black on the bottom, in PIECE_ORDER. Rebuild it from the separate PNGs after
+# changing them with:
+#
+#   python sprites.py
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+ATLAS_FILE = os.path.join(ASSET_DIR, "pieces.png")
+COLORS = ['w', 'b']
+PIECE_ORDER = ['p', 'r', 'n', 'b', 'q', 'k']
+
+
+def build_atlas(directory=ASSET_DIR):
+    images = [[pygame.image.load(os.path.join(directory, f"{color}{piece}.png")) for piece in PIECE_ORDER]
+              for color in COLORS]
+    cell = max(max(image.get_width(), image.get_height()) for row in images for image in row)
+    atlas = pygame.Surface((cell * len(PIECE_ORDER), cell * len(COLORS)), pygame.SRCALPHA)
+    for row, row_images in enumerate(images):
+        for column, image in enumerate(row_images):
+            x = column * cell + (cell - image.get_width()) // 2
+            y = row * cell + (cell - image.get_height()) // 2
+            atlas.blit(image, (x, y))
+    return atlas
+
+
+class PieceSprites:
+    """Piece images cut from the atlas and scaled on first use.
+
+    Scaled copies are kept per (name, size), so several piece sizes, or a
+    resized board, each cost one scale per piece rather than one per frame.
+    Everything is converted to the display's pixel format, so blits don't
+    convert pixels every time. Needs a display mode set before first use.
+    """
+
+    def __init__(self, path=ATLAS_FILE):
+        self.path = path
+        self._pieces = None
+        self._scaled = {}
+
+    def _load(self):
+        if os.path.exists(self.path):
+            atlas = pygame.image.load(self.path)
+        else:
+            atlas = build_atlas(os.path.dirname(self.path))
+        atlas = atlas.convert_alpha()
+        cell = atlas.get_height() // len(COLORS)
+        self._pieces = {}
+        for row, color in enumerate(COLORS):
+            for column, piece in enumerate(PIECE_ORDER):
+                self._pieces[f"{color}{piece}"] = atlas.subsurface((column * cell, row * cell, cell, cell))
+
+    def get(self, name, size):
+        # *name* is like 'wp' or 'bk'; *size* is the side length in pixels.
+        image = self._scaled.get((name, size))
+        if image is None:
+            if self._pieces is None:
+                self._load()
+            image = self._scaled[(name, size)] = pygame.transform.scale(self._pieces[name], (size, size))
+        return image
+
+    def clear(self):
+        # Drops the scaled copies, e.g. after the display format changed.
+        self._pieces = None
+        self._scaled.clear()
+
+
+if __name__ == "__main__":
+    pygame.image.save(build_atlas(), ATLAS_FILE)
+    print(f"wrote {ATLAS_FILE}")
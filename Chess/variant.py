@@ -0,0 +1,542 @@
+import dataclasses
+import random
+import re
+
+import chess
+import chess.polyglot
+from chess import (BB_ALL, BB_SQUARES, BB_A1, BB_H1, BB_A8, BB_H8,
+                   BB_KING_ATTACKS, BB_KNIGHT_ATTACKS, BB_PAWN_ATTACKS,
+                   BB_RANK_ATTACKS, BB_FILE_ATTACKS, BB_DIAG_ATTACKS,
+                   BB_RANK_MASKS, BB_FILE_MASKS, BB_DIAG_MASKS)
+
+# House rules:
+#  - Once per game each side may teleport a queen to any empty square.
+#  - A knight may hop twice in one turn. Afterwards that side's knights are on
+#    cooldown; every ply (including the double jump itself) ticks the counter
+#    down, so the side skips one full turn before jumping again.
+KNIGHT_COOLDOWN = 3
+
+TELEPORT = 1
+DOUBLE_JUMP = 2
+
+# The variant state is packed into one int: bit 0 (Black) and bit 1 (White)
+# are set once that side has teleported, bits 2-3 and 4-5 hold Black's and
+# White's knight cooldown, so KNIGHT_COOLDOWN must fit in two bits.
+STATE_BITS = 6
+_TELEPORT_BIT = [1, 2]
+_COOLDOWN_SHIFT = [2, 4]
+
+
+def pack_state(teleport_used, knight_cooldown):
+    # Both arguments are indexed by color, Black first.
+    return (bool(teleport_used[0]) | bool(teleport_used[1]) << 1 |
+            knight_cooldown[0] << 2 | knight_cooldown[1] << 4)
+
+
+def unpack_state(state):
+    return (bool(state & 1), bool(state & 2)), ((state >> 2) & 3, state >> 4)
+
+
+# The state after one more ply has ticked both cooldowns down.
+_TICKED = [pack_state(teleport_used, (max(black - 1, 0), max(white - 1, 0)))
+           for teleport_used, (black, white) in map(unpack_state, range(1 << STATE_BITS))]
+
+# Zobrist keys for the variant state, on top of the polyglot keys for the board.
+_zobrist_random = random.Random(0x7E1E)
+ZOBRIST_TELEPORT = [_zobrist_random.getrandbits(64) for _ in range(2)]
+ZOBRIST_COOLDOWN = [[_zobrist_random.getrandbits(64) for _ in range(KNIGHT_COOLDOWN + 1)] for _ in range(2)]
+
+
+def _state_key(state):
+    teleport_used, knight_cooldown = unpack_state(state)
+    key = 0
+    for color in (chess.BLACK, chess.WHITE):
+        if teleport_used[color]:
+            key ^= ZOBRIST_TELEPORT[color]
+        if knight_cooldown[color] <= KNIGHT_COOLDOWN:  # higher values never occur
+            key ^= ZOBRIST_COOLDOWN[color][knight_cooldown[color]]
+    return key
+
+
+ZOBRIST_STATE = [_state_key(state) for state in range(1 << STATE_BITS)]
+
+_POLYGLOT = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+_polyglot_hasher = chess.polyglot.ZobristHasher(_POLYGLOT)
+
+
+def _piece_key(pieces, white, mask, square):
+    # Polyglot key of the piece on *square* (bit *mask*), where *pieces* is a
+    # board or a stack snapshot and *white* holds its white pieces.
+    if pieces.pawns & mask:
+        index = 0
+    elif pieces.knights & mask:
+        index = 2
+    elif pieces.bishops & mask:
+        index = 4
+    elif pieces.rooks & mask:
+        index = 6
+    elif pieces.queens & mask:
+        index = 8
+    else:
+        index = 10
+    return _POLYGLOT[64 * (index + bool(white & mask)) + square]
+
+
+def _board_key_delta(old, old_white, old_black, new, new_white, new_black):
+    # XOR of the piece keys that differ between two positions one move apart.
+    # Every square a move changes changes occupancy or color, even for
+    # promotions, castling and en passant.
+    delta = 0
+    changed = (old_white ^ new_white) | (old_black ^ new_black)
+    while changed:
+        mask = changed & -changed
+        changed ^= mask
+        square = mask.bit_length() - 1
+        if (old_white | old_black) & mask:
+            delta ^= _piece_key(old, old_white, mask, square)
+        if (new_white | new_black) & mask:
+            delta ^= _piece_key(new, new_white, mask, square)
+    return delta
+
+
+# How many plies zobrist_hash() replays from the last known board key before
+# it hashes the board from scratch instead.
+_MAX_REPLAY = 8
+
+
+@dataclasses.dataclass(unsafe_hash=True)
+class VariantMove(chess.Move):
+    """A house-rule move. Double jumps also carry the intermediate square."""
+
+    kind: int = TELEPORT
+    via: int = None
+
+    @classmethod
+    def teleport(cls, from_square, to_square):
+        return cls(from_square, to_square, kind=TELEPORT)
+
+    @classmethod
+    def double_jump(cls, from_square, via, to_square):
+        return cls(from_square, to_square, kind=DOUBLE_JUMP, via=via)
+
+    def uci(self):
+        # Teleports are written "d1~h5", double jumps "b1c3d5".
+        if self.kind == TELEPORT:
+            return chess.SQUARE_NAMES[self.from_square] + "~" + chess.SQUARE_NAMES[self.to_square]
+        return (chess.SQUARE_NAMES[self.from_square] + chess.SQUARE_NAMES[self.via] +
+                chess.SQUARE_NAMES[self.to_square])
+
+    def __repr__(self):
+        return f"VariantMove.from_uci({self.uci()!r})"
+
+    @classmethod
+    def from_uci(cls, uci):
+        try:
+            if len(uci) == 5 and uci[2] == "~":
+                return cls.teleport(chess.parse_square(uci[:2]), chess.parse_square(uci[3:]))
+            if len(uci) == 6:
+                return cls.double_jump(chess.parse_square(uci[:2]), chess.parse_square(uci[2:4]),
+                                       chess.parse_square(uci[4:]))
+        except ValueError:
+            pass
+        raise chess.InvalidMoveError(f"invalid variant uci: {uci!r}")
+
+
+# SAN of variant moves, e.g. "Qd1~h5" and "Nb1-c3xd5" (check suffix optional).
+VARIANT_SAN_REGEX = re.compile(r"^(?:Q([a-h][1-8])~([a-h][1-8])|N([a-h][1-8])[-x]([a-h][1-8])[-x]([a-h][1-8]))[+#]?\Z")
+
+
+def parse_move(uci):
+    # Accepts both regular UCI and the variant forms above.
+    if len(uci) == 6 or "~" in uci:
+        return VariantMove.from_uci(uci)
+    return chess.Move.from_uci(uci)
+
+
+class VariantBoard(chess.Board):
+    """A chess.Board that also knows the teleport and double-jump rules.
+
+    Variant moves are ordinary entries in ``legal_moves`` and on the move
+    stack, so ``push``/``pop``, checkmate and repetition detection all account
+    for them.
+    """
+
+    def __init__(self, fen=chess.STARTING_FEN, *, chess960=False):
+        self._state = 0  # see pack_state()
+        # Polyglot key of the pieces alone, or None until zobrist_hash() needs
+        # it. Moves only reset it; it is brought up to date lazily from the
+        # last known key and the board snapshots on the stack.
+        self._board_key = None
+        # Per ply, from before the move: the packed state and the board key.
+        self._variant_stack = []
+        self._key_stack = []
+        super().__init__(fen, chess960=chess960)
+
+    # Indexed by color (chess.BLACK == 0, chess.WHITE == 1). Both read as
+    # tuples; assign a whole sequence to change them.
+
+    @property
+    def teleport_used(self):
+        return (bool(self._state & 1), bool(self._state & 2))
+
+    @teleport_used.setter
+    def teleport_used(self, value):
+        self._state = self._state & ~3 | pack_state(value, (0, 0))
+
+    @property
+    def knight_cooldown(self):
+        return ((self._state >> 2) & 3, self._state >> 4)
+
+    @knight_cooldown.setter
+    def knight_cooldown(self, value):
+        self._state = self._state & 3 | pack_state((False, False), value)
+
+    def reset(self):
+        self._state = 0
+        super().reset()
+
+    def clear(self):
+        self._state = 0
+        super().clear()
+
+    def clear_stack(self):
+        super().clear_stack()
+        self._variant_stack.clear()
+        self._key_stack.clear()
+
+    def _reset_board(self):
+        super()._reset_board()
+        self._board_key = None
+
+    def _clear_board(self):
+        super()._clear_board()
+        self._board_key = None
+
+    def _set_chess960_pos(self, scharnagl):
+        super()._set_chess960_pos(scharnagl)
+        self._board_key = None
+
+    def set_piece_at(self, square, piece, promoted=False):
+        super().set_piece_at(square, piece, promoted)
+        self._board_key = None
+
+    def remove_piece_at(self, square):
+        piece = super().remove_piece_at(square)
+        self._board_key = None
+        return piece
+
+    def apply_transform(self, f):
+        super().apply_transform(f)
+        self._board_key = None
+
+    def copy(self, *, stack=True):
+        board = super().copy(stack=stack)
+        board._state = self._state
+        board._board_key = self._board_key
+        if stack:
+            stack = len(self.move_stack) if stack is True else stack
+            board._variant_stack = self._variant_stack[-stack:] if stack else []
+            board._key_stack = self._key_stack[-stack:] if stack else []
+        return board
+
+    def root(self):
+        board = super().root()
+        if self._variant_stack:
+            board._state = self._variant_stack[0]
+            board._board_key = self._key_stack[0]
+        return board
+
+    def _transposition_key(self):
+        return super()._transposition_key() + (self._state,)
+
+    def zobrist_hash(self):
+        # Same value as chess.polyglot.zobrist_hash() combined with the keys
+        # for the variant state, without rescanning the board.
+        key = self._board_key
+        if key is None:
+            key = self._board_key = self._replay_board_key()
+        if self.castling_rights:
+            rights = self.clean_castling_rights()
+            if rights & BB_H1:
+                key ^= _POLYGLOT[768]
+            if rights & BB_A1:
+                key ^= _POLYGLOT[769]
+            if rights & BB_H8:
+                key ^= _POLYGLOT[770]
+            if rights & BB_A8:
+                key ^= _POLYGLOT[771]
+        # Polyglot only counts an en passant square that a pawn could capture on.
+        if self.ep_square and (BB_PAWN_ATTACKS[not self.turn][self.ep_square]
+                               & self.pawns & self.occupied_co[self.turn]):
+            key ^= _POLYGLOT[772 + chess.square_file(self.ep_square)]
+        if self.turn:
+            key ^= _POLYGLOT[780]
+        return key ^ ZOBRIST_STATE[self._state]
+
+    def _replay_board_key(self):
+        keys = self._key_stack
+        index = len(keys) - 1
+        stop = max(index - _MAX_REPLAY, -1)
+        while index > stop and keys[index] is None:
+            index -= 1
+        if index == stop:
+            return _polyglot_hasher.hash_board(self)
+        key = keys[index]
+        snapshots = self._stack
+        for old, new in zip(snapshots[index:], snapshots[index + 1:]):
+            key ^= _board_key_delta(old, old.occupied_w, old.occupied_b, new, new.occupied_w, new.occupied_b)
+        old = snapshots[-1]
+        return key ^ _board_key_delta(old, old.occupied_w, old.occupied_b,
+                                      self, self.occupied_co[chess.WHITE], self.occupied_co[chess.BLACK])
+
+    # Masks
+
+    def _checkers(self, king, color, occupied, attackers):
+        # Pieces in *attackers* that attack *king* (of *color*) with the given
+        # occupancy. Lets callers drop captured pieces from the attacker set.
+        queens_and_rooks = (self.queens | self.rooks) & attackers
+        queens_and_bishops = (self.queens | self.bishops) & attackers
+        return ((BB_KING_ATTACKS[king] & self.kings & attackers) |
+                (BB_KNIGHT_ATTACKS[king] & self.knights & attackers) |
+                (BB_PAWN_ATTACKS[color][king] & self.pawns & attackers) |
+                (BB_RANK_ATTACKS[king][BB_RANK_MASKS[king] & occupied] & queens_and_rooks) |
+                (BB_FILE_ATTACKS[king][BB_FILE_MASKS[king] & occupied] & queens_and_rooks) |
+                (BB_DIAG_ATTACKS[king][BB_DIAG_MASKS[king] & occupied] & queens_and_bishops))
+
+    def _evasion_mask(self, king, checkers):
+        # Squares a non-king piece may land on to deal with *checkers*.
+        if not checkers:
+            return BB_ALL
+        checker = chess.msb(checkers)
+        if BB_SQUARES[checker] != checkers:
+            return 0
+        return chess.between(king, checker) | checkers
+
+    def _knight_hop_mask(self, square, occupied, ours, theirs):
+        # Legal knight hops from *square*. A hop never stays on the line it
+        # left, so a pin shows up here as an unanswerable check. The second
+        # hop of a double jump could reach the enemy king, which is never a
+        # legal target.
+        hops = BB_KNIGHT_ATTACKS[square] & ~ours & ~(self.kings & theirs)
+        king = self.king(self.turn)
+        if king is None:
+            return hops
+        checkers = self._checkers(king, self.turn, occupied & ~BB_SQUARES[square], theirs)
+        return hops & self._evasion_mask(king, checkers)
+
+    def legal_targets_mask(self, square):
+        # Destinations of ordinary legal moves from *square*.
+        mask = 0
+        for move in super().generate_legal_moves(BB_SQUARES[square]):
+            mask |= BB_SQUARES[move.to_square]
+        return mask
+
+    def teleport_targets_mask(self, square):
+        us = self.turn
+        if self._state & _TELEPORT_BIT[us] or not self.queens & self.occupied_co[us] & BB_SQUARES[square]:
+            return 0
+        empty = ~self.occupied & BB_ALL
+        king = self.king(us)
+        if king is None:
+            return empty
+        checkers = self._checkers(king, us, self.occupied & ~BB_SQUARES[square], self.occupied_co[not us])
+        # A teleport cannot capture, so it can only answer a check by blocking.
+        return empty & self._evasion_mask(king, checkers)
+
+    def double_jump_vias_mask(self, square):
+        us = self.turn
+        if self._state >> _COOLDOWN_SHIFT[us] & 3 or not self.knights & self.occupied_co[us] & BB_SQUARES[square]:
+            return 0
+        return self._knight_hop_mask(square, self.occupied, self.occupied_co[us], self.occupied_co[not us])
+
+    def double_jump_targets_mask(self, square, via):
+        # Second hop after the knight on *square* has landed on *via*.
+        from_bb = BB_SQUARES[square]
+        via_bb = BB_SQUARES[via]
+        occupied = (self.occupied & ~from_bb) | via_bb
+        ours = (self.occupied_co[self.turn] & ~from_bb) | via_bb
+        theirs = self.occupied_co[not self.turn] & ~via_bb
+        return self._knight_hop_mask(via, occupied, ours, theirs)
+
+    # Move generation
+
+    def generate_variant_moves(self, from_mask=BB_ALL, to_mask=BB_ALL):
+        if self.is_variant_end():
+            return
+        ours = self.occupied_co[self.turn]
+        for square in chess.scan_reversed(self.queens & ours & from_mask):
+            for to_square in chess.scan_reversed(self.teleport_targets_mask(square) & to_mask):
+                yield VariantMove.teleport(square, to_square)
+        for square in chess.scan_reversed(self.knights & ours & from_mask):
+            for via in chess.scan_reversed(self.double_jump_vias_mask(square)):
+                for to_square in chess.scan_reversed(self.double_jump_targets_mask(square, via) & to_mask):
+                    yield VariantMove.double_jump(square, via, to_square)
+
+    def generate_legal_moves(self, from_mask=BB_ALL, to_mask=BB_ALL):
+        yield from super().generate_legal_moves(from_mask, to_mask)
+        if not self._standard_only:
+            yield from self.generate_variant_moves(from_mask, to_mask)
+
+    def generate_legal_captures(self, from_mask=BB_ALL, to_mask=BB_ALL):
+        # chess.Board only looks for moves landing on an enemy piece, which
+        # misses double jumps that capture on the via square and land on an
+        # empty one.
+        yield from super().generate_legal_captures(from_mask, to_mask)
+        if self._standard_only or self.is_variant_end():
+            return
+        ours = self.occupied_co[self.turn]
+        theirs = self.occupied_co[not self.turn]
+        for square in chess.scan_reversed(self.knights & ours & from_mask):
+            for via in chess.scan_reversed(self.double_jump_vias_mask(square) & theirs):
+                for to_square in chess.scan_reversed(self.double_jump_targets_mask(square, via) & to_mask & ~theirs):
+                    yield VariantMove.double_jump(square, via, to_square)
+
+    def _is_legal_variant(self, move):
+        to_bb = BB_SQUARES[move.to_square]
+        if move.kind == TELEPORT:
+            return bool(self.teleport_targets_mask(move.from_square) & to_bb)
+        if move.kind == DOUBLE_JUMP and move.via is not None:
+            return bool(self.double_jump_vias_mask(move.from_square) & BB_SQUARES[move.via] and
+                        self.double_jump_targets_mask(move.from_square, move.via) & to_bb)
+        return False
+
+    def is_pseudo_legal(self, move):
+        if isinstance(move, VariantMove):
+            return self._is_legal_variant(move)
+        return super().is_pseudo_legal(move)
+
+    def is_legal(self, move):
+        if isinstance(move, VariantMove):
+            return not self.is_variant_end() and self._is_legal_variant(move)
+        return super().is_legal(move)
+
+    def is_capture(self, move):
+        if isinstance(move, VariantMove):
+            if move.kind == TELEPORT:
+                return False
+            return bool((BB_SQUARES[move.via] | BB_SQUARES[move.to_square]) & self.occupied_co[not self.turn])
+        return super().is_capture(move)
+
+    def is_zeroing(self, move):
+        if isinstance(move, VariantMove):
+            return self.is_capture(move)
+        return super().is_zeroing(move)
+
+    def is_irreversible(self, move):
+        if isinstance(move, VariantMove):
+            return move.kind == TELEPORT or self.is_capture(move)
+        return super().is_irreversible(move)
+
+    def captured_pieces(self, move):
+        # Pieces *move* would take, in the order they are taken.
+        if isinstance(move, VariantMove):
+            if move.kind == TELEPORT:
+                return []
+            squares = [move.via, move.to_square]
+        elif self.is_en_passant(move):
+            squares = [self.ep_square + (-8 if self.turn == chess.WHITE else 8)]
+        elif self.is_castling(move):
+            return []
+        else:
+            squares = [move.to_square]
+        pieces = []
+        for square in squares:
+            piece = self.piece_at(square)
+            if piece and piece.color != self.turn:
+                pieces.append(piece)
+        return pieces
+
+    # Notation
+
+    # Standard SAN is written and read as if only standard moves existed:
+    # variant moves have their own notation, so they must not make "Qh5" or
+    # "Nc3" ambiguous.
+    _standard_only = False
+
+    def _algebraic_without_suffix(self, move, *, long=False):
+        if not isinstance(move, VariantMove):
+            self._standard_only = True
+            try:
+                return super()._algebraic_without_suffix(move, long=long)
+            finally:
+                self._standard_only = False
+        names = chess.SQUARE_NAMES
+        if move.kind == TELEPORT:
+            return "Q" + names[move.from_square] + "~" + names[move.to_square]
+        theirs = self.occupied_co[not self.turn]
+        first = "x" if theirs & BB_SQUARES[move.via] else "-"
+        second = "x" if theirs & BB_SQUARES[move.to_square] and move.to_square != move.via else "-"
+        return "N" + names[move.from_square] + first + names[move.via] + second + names[move.to_square]
+
+    def parse_san(self, san):
+        match = VARIANT_SAN_REGEX.match(san)
+        if match is None:
+            self._standard_only = True
+            try:
+                return super().parse_san(san)
+            finally:
+                self._standard_only = False
+        squares = [chess.parse_square(name) for name in match.groups() if name]
+        if len(squares) == 2:
+            move = VariantMove.teleport(*squares)
+        else:
+            move = VariantMove.double_jump(*squares)
+        if not self.is_legal(move):
+            raise chess.IllegalMoveError(f"illegal san: {san!r} in {self.fen()}")
+        return move
+
+    def parse_uci(self, uci):
+        if len(uci) == 6 or "~" in uci:
+            move = VariantMove.from_uci(uci)
+            if not self.is_legal(move):
+                raise chess.IllegalMoveError(f"illegal uci: {uci!r} in {self.fen()}")
+            return move
+        return super().parse_uci(uci)
+
+    # Making moves
+
+    def push(self, move):
+        self._variant_stack.append(self._state)
+        self._key_stack.append(self._board_key)
+        self._board_key = None
+        if isinstance(move, VariantMove):
+            self._push_variant(move)
+        else:
+            super().push(move)
+        self._state = _TICKED[self._state]
+
+    def _push_variant(self, move):
+        board_state = chess._BoardState(self)
+        self.castling_rights = self.clean_castling_rights()
+        self.move_stack.append(move)
+        self._stack.append(board_state)
+
+        self.ep_square = None
+        self.halfmove_clock += 1
+        if self.turn == chess.BLACK:
+            self.fullmove_number += 1
+
+        us = self.turn
+        if move.kind == TELEPORT:
+            promoted = bool(self.promoted & BB_SQUARES[move.from_square])
+            self._remove_piece_at(move.from_square)
+            self._set_piece_at(move.to_square, chess.QUEEN, us, promoted)
+            self._state |= _TELEPORT_BIT[us]
+        else:
+            if self.is_capture(move):
+                self.halfmove_clock = 0
+            promoted = bool(self.promoted & BB_SQUARES[move.from_square])
+            for from_square, to_square in ((move.from_square, move.via), (move.via, move.to_square)):
+                self._remove_piece_at(from_square)
+                self.castling_rights &= ~BB_SQUARES[to_square]
+                self._set_piece_at(to_square, chess.KNIGHT, us, promoted)
+            shift = _COOLDOWN_SHIFT[us]
+            self._state = self._state & ~(3 << shift) | KNIGHT_COOLDOWN << shift
+
+        self.turn = not us
+
+    def pop(self):
+        move = super().pop()
+        self._state = self._variant_stack.pop()
+        self._board_key = self._key_stack.pop()
+        return move
@@ -0,0 +1,234 @@
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+import chess
+
+from book import BOOK_FILE, ENDGAME_FILE, OpeningBook, EndgameTable
+from engine import Engine
+from variant import VariantBoard, parse_move
+
+# The engine runs in its own process and talks over stdin/stdout with a small
+# UCI-like protocol. Every search carries an id so stale answers can be told
+# apart from the one the UI is waiting for:
+#
+#   position startpos [moves m1 m2 ...]
+#   position fen <fen> [moves m1 m2 ...]
+#   go id <n> movetime <ms> [ponder]
+#   ponderhit                       (the pondered move was played)
+#   stop                            (cancel; the search still answers)
+#   newgame
+#   quit
+#
+#   info id <n> depth <d> score <cp> move <m>
+#   bestmove id <n> <m> [ponder <m>]
+
+
+class EngineWorker:
+    """UI-side handle on the engine process. Nothing here blocks.
+
+    *notify* is called from a reader thread whenever the engine says
+    something, so a UI can sleep until then instead of polling.
+    """
+
+    def __init__(self, time_limit=1.0, notify=None):
+        self.time_limit = time_limit
+        self._notify = notify
+        self._process = subprocess.Popen(
+            [sys.executable, "-u", __file__],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+        self._next_id = 0
+
+        self.request_id = None  # search whose answer the UI is waiting for
+        self.pondering = False
+        self.ponder_move = None  # opponent move being pondered on
+        self.expected_reply = None  # engine's guess at the opponent's next move
+
+        # Progressive results of the current search.
+        self.best_move = None
+        self.depth = 0
+        self.score = 0
+
+    def _read(self):
+        for line in self._process.stdout:
+            self._lines.put(line.split())
+            if self._notify is not None:
+                self._notify()
+
+    def _send(self, line):
+        self._process.stdin.write(line + "\n")
+        self._process.stdin.flush()
+
+    def _go(self, board, time_limit, ponder):
+        root = board.root()
+        if root.fen() == chess.STARTING_FEN:
+            position = "position startpos"
+        else:
+            position = f"position fen {root.fen()}"
+        if board.move_stack:
+            position += " moves " + " ".join(move.uci() for move in board.move_stack)
+        self._send(position)
+
+        self._next_id += 1
+        self.request_id = self._next_id
+        self.best_move = None
+        self.depth = 0
+        self.score = 0
+        time_limit = self.time_limit if time_limit is None else time_limit
+        self._send(f"go id {self.request_id} movetime {int(time_limit * 1000)}" + (" ponder" if ponder else ""))
+
+    def request(self, board, time_limit=None):
+        self.cancel()
+        self._go(board, time_limit, False)
+
+    def ponder(self, board, move, time_limit=None):
+        # Think on the opponent's time, assuming they answer with *move*.
+        self.cancel()
+        board = board.copy()
+        board.push(move)
+        self._go(board, time_limit, True)
+        self.pondering = True
+        self.ponder_move = move
+
+    def ponderhit(self):
+        self._send("ponderhit")
+        self.pondering = False
+        self.ponder_move = None
+
+    def cancel(self):
+        if self.request_id is not None:
+            self._send("stop")
+        self.request_id = None
+        self.pondering = False
+        self.ponder_move = None
+
+    def new_game(self):
+        self.cancel()
+        self._send("newgame")
+
+    def poll(self):
+        # Returns the engine's move once the current request is answered.
+        while True:
+            try:
+                tokens = self._lines.get_nowait()
+            except queue.Empty:
+                return None
+            if len(tokens) < 4 or int(tokens[2]) != self.request_id:
+                continue
+            if tokens[0] == "info":
+                self.depth = int(tokens[4])
+                self.score = int(tokens[6])
+                self.best_move = parse_move(tokens[8])
+            elif tokens[0] == "bestmove" and not self.pondering:
+                self.request_id = None
+                self.expected_reply = parse_move(tokens[5]) if len(tokens) > 5 else None
+                return parse_move(tokens[3])
+
+    def close(self):
+        try:
+            self._send("quit")
+            self._process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+
+
+def _parse_position(tokens):
+    if tokens[0] == "startpos":
+        board = VariantBoard()
+        rest = tokens[1:]
+    else:
+        board = VariantBoard(" ".join(tokens[1:7]))
+        rest = tokens[7:]
+    if rest and rest[0] == "moves":
+        for uci in rest[1:]:
+            board.push_uci(uci)
+    return board
+
+
+def main():
+    # Book and endgame files are optional; see book.py for building them.
+    book = OpeningBook(BOOK_FILE) if os.path.exists(BOOK_FILE) else None
+    endgame = EndgameTable(ENDGAME_FILE) if os.path.exists(ENDGAME_FILE) else None
+    engine = Engine(book=book, endgame=endgame)
+    board = VariantBoard()
+    search = None
+    started = threading.Event()  # the search has taken its deadline
+    released = threading.Event()  # a ponder search may report
+    write_lock = threading.Lock()
+
+    def write(line):
+        with write_lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    def run(request_id, board, time_limit, ponder):
+        def info(depth, score, move):
+            started.set()
+            write(f"info id {request_id} depth {depth} score {score} move {move.uci()}")
+
+        move = engine.search(board, time_limit=time_limit, callback=info, ponder=ponder)
+        started.set()
+        # A ponder search that ends early (mate found) holds its answer until ponderhit or stop.
+        released.wait()
+        if move is None:
+            write(f"bestmove id {request_id} 0000")
+            return
+        line = f"bestmove id {request_id} {move.uci()}"
+        pv = engine.principal_variation(board, 2)
+        if len(pv) == 2 and pv[0] == move:
+            line += f" ponder {pv[1].uci()}"
+        write(line)
+
+    def cancel():
+        # Wait until the search has taken its deadline, or it would clear the stop flag.
+        started.wait()
+        engine.stop()
+        released.set()
+
+    def finish():
+        if search is not None:
+            cancel()
+            search.join()
+
+    time_limit = engine.time_limit
+    for line in sys.stdin:
+        tokens = line.split()
+        if not tokens:
+            continue
+        command = tokens[0]
+        if command == "position":
+            board = _parse_position(tokens[1:])
+        elif command == "go":
+            finish()
+            request_id = int(tokens[tokens.index("id") + 1])
+            if "movetime" in tokens:
+                time_limit = int(tokens[tokens.index("movetime") + 1]) / 1000
+            ponder = "ponder" in tokens
+            started.clear()
+            if ponder:
+                released.clear()
+            else:
+                released.set()
+            search = threading.Thread(target=run, args=(request_id, board.copy(), time_limit, ponder))
+            search.start()
+        elif command == "ponderhit":
+            started.wait()
+            engine.set_time_limit(time_limit)
+            released.set()
+        elif command == "stop":
+            if search is not None:
+                cancel()
+        elif command == "newgame":
+            finish()
+            engine.tt.clear()
+        elif command == "quit":
+            break
+    finish()
+
+
+if __name__ == "__main__":
+    main()
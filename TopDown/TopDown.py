@@ -1,11 +1,39 @@
+import argparse
+import os
 import pygame
 import math
 import random
 import time
 
+import numpy as np
+
+from entities import EntityPool
+from hud import Hud
+from spatial import close_pairs
+from spawner import SpawnScheduler
+from sprites import RotationCache
+
+# python TopDown.py --headless runs the simulation with no window and no frame cap, with the player
+# standing still and shooting at the nearest enemy, and prints how fast it went
+parser = argparse.ArgumentParser(description="Top-down shooter.")
+parser.add_argument("--headless", action="store_true", help="simulate without a window, as fast as possible")
+parser.add_argument("--steps", type=int, default=60 * 60 * 5, help="steps to simulate headless (default: 5 minutes)")
+parser.add_argument("--seed", type=int, help="random seed")
+args = parser.parse_args()
+if args.seed is not None:
+    random.seed(args.seed)
+if args.headless:
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+
 # Initialize Pygame
 pygame.init()
 
+# The game advances in fixed steps of time_step seconds, however fast frames are drawn. Speeds are per step.
+time_step = 1 / 60
+max_frame_time = 0.25  # Longer frames are cut short, so a stall doesn't run hundreds of steps at once
+max_fps = 120
+headless_fire_interval = 10  # Steps between headless shots
+
 # Screen dimensions
 screen_width = 800
 screen_height = 600
@@ -43,12 +71,15 @@ gun_length = 40
 gun_width = 8
 gun_offset_x = 65  # Offset from player center
 gun_offset_y = 0
+gun_rotation_steps = 180  # Angles the gun can point at, 2 degrees apart
+smooth_rotation = False  # Filter the rotated gun (slower to build, softer edges)
+gun_rotations = RotationCache(gun_img, gun_rotation_steps, smooth_rotation)
 
 # Bullet properties
 bullet_size = 5
 bullet_color = white  # Bullets are now white
 bullet_speed = 10
-bullets = []
+bullets = EntityPool()
 
 # Enemy properties
 enemy_colors = {
@@ -64,7 +95,19 @@ enemy_types = {
     "hard": {"health": 15, "size": 40, "speed": 0.3}
 }
 
-enemies = []
+# Enemy type codes stored in the entity pool, and what each is worth
+enemy_kinds = list(enemy_types)
+enemy_kind_colors = [enemy_colors[enemy_type] for enemy_type in enemy_kinds]
+enemy_points = np.array([10, 25, 50])
+
+enemies = EntityPool()
+
+# Waves are queued and streamed in spawn_rate enemies per step, with at most max_enemies alive at once
+max_enemies = 300
+spawn_rate = 2
+
+# Bullets are only tested against enemies in nearby grid cells of this size
+max_enemy_size = max(enemy_type["size"] for enemy_type in enemy_types.values())
 
 # Power-up properties
 powerup_types = ["health", "speed", "damage"]  # Example power-ups
@@ -72,13 +115,14 @@ powerup_duration = 5  # seconds
 active_powerups = {}  # Store active powerups and their expiration times
 
 crate = None  # No crate initially
-crate_spawn_time = time.time() + random.randint(120, 180)  # First crate after 2-3 minutes
-
 # Game variables
+game_time = 0.0  # Seconds simulated, which is what power-ups and crates are timed by
+crate_spawn_time = game_time + random.randint(120, 180)  # First crate after 2-3 minutes
 points = 0
 wave = 1
 game_over = False
 font = pygame.font.Font(None, 36)
+hud = Hud(font)
 
 # Function to calculate angle between two points
 def calculate_angle(x1, y1, x2, y2):
@@ -104,15 +148,8 @@ def create_enemy(enemy_type):
     elif y > screen_height - size:
         y = screen_height - size
 
-    return {
-        "x": x,
-        "y": y,
-        "size": size,
-        "color": enemy_colors[enemy_type],
-        "health": enemy_types[enemy_type]["health"],
-        "speed": enemy_types[enemy_type]["speed"],
-        "type": enemy_type
-    }
+    enemies.add(x, y, size=size, health=enemy_types[enemy_type]["health"],
+                speed=enemy_types[enemy_type]["speed"], kind=enemy_kinds.index(enemy_type))
 
 # Function to generate a wave of enemies
 def generate_wave(wave_number):
@@ -120,12 +157,11 @@ def generate_wave(wave_number):
     num_medium = wave_number
     num_hard = wave_number // 3  # Fewer hard enemies
 
-    for _ in range(num_easy):
-        enemies.append(create_enemy("easy"))
-    for _ in range(num_medium):
-        enemies.append(create_enemy("medium"))
-    for _ in range(num_hard):
-        enemies.append(create_enemy("hard"))
+    wave_enemies = ["easy"] * num_easy + ["medium"] * num_medium + ["hard"] * num_hard
+    random.shuffle(wave_enemies)  # Mix the types as they stream in
+    spawner.add(wave_enemies)
+
+spawner = SpawnScheduler(create_enemy, max_enemies, spawn_rate)
 
 # Function to create a crate
 def create_crate():
@@ -140,15 +176,15 @@ def apply_powerup(powerup_type):
         player_health = min(100, player_health + 25)  # Heal up to 100
     elif powerup_type == "speed":
         player_speed *= 1.5
-        active_powerups["speed"] = time.time() + powerup_duration
+        active_powerups["speed"] = game_time + powerup_duration
     elif powerup_type == "damage":
         bullet_speed *= 2
-        active_powerups["damage"] = time.time() + powerup_duration
+        active_powerups["damage"] = game_time + powerup_duration
 
 # Function to check for expired power-ups
 def check_powerups():
     global player_speed, bullet_speed
-    now = time.time()
+    now = game_time
     if "speed" in active_powerups and now > active_powerups["speed"]:
         player_speed /= 1.5
         del active_powerups["speed"]
@@ -156,177 +192,230 @@ def check_powerups():
         bullet_speed /= 2
         del active_powerups["damage"]
 
-# Game loop
-running = True
-clock = pygame.time.Clock()
+# Function to fire a bullet from the player towards a point
+def fire(target_x, target_y):
+    angle = calculate_angle(player_x, player_y, target_x, target_y)
+    bullets.add(player_x, player_y, dx=math.cos(angle), dy=math.sin(angle))
 
-generate_wave(wave)  # Generate the first wave
+# Function to advance the game by one time step
+def step():
+    global player_x, player_y, player_health, points, wave, game_over, crate, crate_spawn_time
+    global active_powerups, player_speed, bullet_speed, game_time, previous_player
 
-while running:
-    # Event handling
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 1:  # Left click
-                mouse_x, mouse_y = pygame.mouse.get_pos()
-                angle = calculate_angle(player_x, player_y, mouse_x, mouse_y)
-                bullets.append({
-                    "x": player_x,
-                    "y": player_y,
-                    "angle": angle
-                })
-
-    # Game logic
-    if not game_over:
-        # Player movement
+    # Nothing moves while the game is over (or just after a restart), so draw() shows where things are
+    previous_player = (player_x, player_y)
+    bullets.save_positions()
+    enemies.save_positions()
+
+    if game_over:
         keys = pygame.key.get_pressed()
-        if keys[pygame.K_a]:
-            player_x -= player_speed
-        if keys[pygame.K_d]:
-            player_x += player_speed
-        if keys[pygame.K_w]:
-            player_y -= player_speed
-        if keys[pygame.K_s]:
-            player_y += player_speed
-
-        # Keep player within bounds
-        player_x = max(player_size // 2, min(player_x, screen_width - player_size // 2))
-        player_y = max(player_size // 2, min(player_y, screen_height - player_size // 2))
-
-        # Bullet movement
-        for bullet in bullets:
-            bullet["x"] += bullet_speed * math.cos(bullet["angle"])
-            bullet["y"] += bullet_speed * math.sin(bullet["angle"])
-
-        # Enemy movement and collision
-        for enemy in enemies:
-            angle = calculate_angle(enemy["x"], enemy["y"], player_x, player_y)
-            enemy["x"] += enemy["speed"] * math.cos(angle)
-            enemy["y"] += enemy["speed"] * math.sin(angle)
-
-            # Player-enemy collision
-            distance = math.sqrt((player_x - enemy["x"]) ** 2 + (player_y - enemy["y"]) ** 2)
-            if distance < player_size / 2 + enemy["size"] / 2:
-                player_health -= 10  # Adjust damage as needed
-                enemies.remove(enemy)
-                if player_health <= 0:
-                    game_over = True
-
-        # Bullet-enemy collision
-        for bullet in bullets[:]:  # Iterate over a copy to allow removal
-            for enemy in enemies[:]:
-                distance = math.sqrt((bullet["x"] - enemy["x"]) ** 2 + (bullet["y"] - enemy["y"]) ** 2)
-                if distance < bullet_size + enemy["size"] / 2:
-                    enemy["health"] -= 1
-                    bullets.remove(bullet)
-                    if enemy["health"] <= 0:
-                        enemies.remove(enemy)
-                        if enemy["type"] == "easy":
-                            points += 10
-                        elif enemy["type"] == "medium":
-                            points += 25
-                        else:
-                            points += 50
-                    break  # Only hit one enemy per bullet
-
-        # Remove off-screen bullets
-        bullets = [bullet for bullet in bullets if 0 < bullet["x"] < screen_width and 0 < bullet["y"] < screen_height]
-
-        # Wave management
-        if not enemies:
-            wave += 1
+        if keys[pygame.K_SPACE]:
+            # Reset game variables
+            points = 0
+            wave = 1
+            player_health = 100
+            enemies.clear()
+            bullets.clear()
+            spawner.clear()
+            game_over = False
+            crate = None
+            active_powerups = {}
+            player_speed = 3
+            bullet_speed = 10
             generate_wave(wave)
-            print(f"Wave {wave} started!")
-
-        # Crate spawning
-        if crate is None and time.time() > crate_spawn_time:
-            crate = create_crate()
-            crate_spawn_time = time.time() + random.randint(120, 180)  # Next crate
-
-        # Crate collision
-        if crate:
-            distance = math.sqrt((player_x - crate["x"]) ** 2 + (player_y - crate["y"]) ** 2)
-            if distance < player_size / 2 + 15:  # 15 is half the crate size
-                apply_powerup(crate["type"])
-                crate = None
+            crate_spawn_time = game_time + random.randint(120, 180)
+        return
+
+    game_time += time_step
+
+    # Player movement
+    keys = pygame.key.get_pressed()
+    if keys[pygame.K_a]:
+        player_x -= player_speed
+    if keys[pygame.K_d]:
+        player_x += player_speed
+    if keys[pygame.K_w]:
+        player_y -= player_speed
+    if keys[pygame.K_s]:
+        player_y += player_speed
+
+    # Keep player within bounds
+    player_x = max(player_size // 2, min(player_x, screen_width - player_size // 2))
+    player_y = max(player_size // 2, min(player_y, screen_height - player_size // 2))
+
+    # Bullet movement, and bullets that left the screen
+    live = bullets.active()
+    bullets.x[live] += bullet_speed * bullets.dx[live]
+    bullets.y[live] += bullet_speed * bullets.dy[live]
+    bullet_x, bullet_y = bullets.x[live], bullets.y[live]
+    gone = (bullet_x <= 0) | (bullet_x >= screen_width) | (bullet_y <= 0) | (bullet_y >= screen_height)
+    bullets.remove(live[gone])
+    live = live[~gone]
+
+    # Enemy spawning from the queue
+    spawner.update(len(enemies))
+
+    # Enemy movement: every enemy steers straight at the player
+    alive = enemies.active()
+    to_player_x = player_x - enemies.x[alive]
+    to_player_y = player_y - enemies.y[alive]
+    distance = np.hypot(to_player_x, to_player_y)
+    distance[distance == 0] = 1
+    enemies.dx[alive] = to_player_x / distance
+    enemies.dy[alive] = to_player_y / distance
+    enemies.x[alive] += enemies.speed[alive] * enemies.dx[alive]
+    enemies.y[alive] += enemies.speed[alive] * enemies.dy[alive]
+
+    # Player-enemy collision
+    enemy_x, enemy_y, enemy_radius = enemies.x[alive], enemies.y[alive], enemies.size[alive] / 2
+    reach = player_size / 2 + enemy_radius
+    touching = (player_x - enemy_x) ** 2 + (player_y - enemy_y) ** 2 < reach * reach
+    if touching.any():
+        player_health -= 10 * int(touching.sum())  # Adjust damage as needed
+        enemies.remove(alive[touching])
+        if player_health <= 0:
+            game_over = True
+        alive = alive[~touching]
+        enemy_x, enemy_y, enemy_radius = enemy_x[~touching], enemy_y[~touching], enemy_radius[~touching]
+
+    # Bullet-enemy collision
+    hit_bullets, hit_enemies = close_pairs(bullets.x[live], bullets.y[live], bullet_size,
+                                           enemy_x, enemy_y, enemy_radius, max_enemy_size)
+    if len(hit_bullets):
+        # Only hit one enemy per bullet
+        hit_bullets, first = np.unique(hit_bullets, return_index=True)
+        hit_enemies = alive[hit_enemies[first]]
+        bullets.remove(live[hit_bullets])
+        np.subtract.at(enemies.health, hit_enemies, 1)
+        killed = hit_enemies[enemies.health[hit_enemies] <= 0]
+        killed = np.unique(killed)
+        points += int(enemy_points[enemies.kind[killed]].sum())
+        enemies.remove(killed)
+
+    # Wave management
+    if not enemies and not spawner.pending:
+        wave += 1
+        generate_wave(wave)
+        print(f"Wave {wave} started!")
+
+    # Crate spawning
+    if crate is None and game_time > crate_spawn_time:
+        crate = create_crate()
+        crate_spawn_time = game_time + random.randint(120, 180)  # Next crate
+
+    # Crate collision
+    if crate:
+        distance = math.sqrt((player_x - crate["x"]) ** 2 + (player_y - crate["y"]) ** 2)
+        if distance < player_size / 2 + 15:  # 15 is half the crate size
+            apply_powerup(crate["type"])
+            crate = None
 
-        # Check for expired power-ups
-        check_powerups()
+    # Check for expired power-ups
+    check_powerups()
 
-    # Drawing
+# Function to draw the game a fraction alpha of the way from the previous step to the latest one
+def draw(alpha):
     screen.fill(black)  # Set background to black
 
     # Draw player
-    screen.blit(player_img, (player_x - player_img.get_width() // 2, player_y - player_img.get_height() // 2))
+    draw_x = previous_player[0] + (player_x - previous_player[0]) * alpha
+    draw_y = previous_player[1] + (player_y - previous_player[1]) * alpha
+    screen.blit(player_img, (draw_x - player_img.get_width() // 2, draw_y - player_img.get_height() // 2))
 
     # Draw gun
     mouse_x, mouse_y = pygame.mouse.get_pos()
-    angle = calculate_angle(player_x, player_y, mouse_x, mouse_y)
+    angle = gun_rotations.snap(calculate_angle(draw_x, draw_y, mouse_x, mouse_y))
 
     # Calculate gun position with offset
-    gun_x = player_x + math.cos(angle) * gun_offset_x - math.sin(angle) * gun_offset_y
-    gun_y = player_y + math.sin(angle) * gun_offset_x + math.cos(angle) * gun_offset_y
+    gun_x = draw_x + math.cos(angle) * gun_offset_x - math.sin(angle) * gun_offset_y
+    gun_y = draw_y + math.sin(angle) * gun_offset_x + math.cos(angle) * gun_offset_y
 
-    # Rotate the gun image
-    rotated_gun = pygame.transform.rotate(gun_img, -math.degrees(angle))
+    # Rotated gun image, from the cache
+    rotated_gun = gun_rotations.get(angle)
     gun_rect = rotated_gun.get_rect(center=(int(gun_x), int(gun_y)))  # Center the rotation
 
     screen.blit(rotated_gun, gun_rect)
 
     # Draw bullets
-    for bullet in bullets:
-        pygame.draw.circle(screen, bullet_color, (int(bullet["x"]), int(bullet["y"])), bullet_size)
+    x, y = bullets.positions(bullets.active(), alpha)
+    for bx, by in zip(x.astype(int).tolist(), y.astype(int).tolist()):
+        pygame.draw.circle(screen, bullet_color, (bx, by), bullet_size)
 
     # Draw enemies (circles)
-    for enemy in enemies:
-        pygame.draw.circle(screen, enemy["color"], (int(enemy["x"]), int(enemy["y"])), enemy["size"] // 2)
+    alive = enemies.active()
+    x, y = enemies.positions(alive, alpha)
+    for ex, ey, size, kind in zip(x.astype(int).tolist(), y.astype(int).tolist(),
+                                  enemies.size[alive].astype(int).tolist(), enemies.kind[alive].tolist()):
+        pygame.draw.circle(screen, enemy_kind_colors[kind], (ex, ey), size // 2)
 
     # Draw crate
     if crate:
         screen.blit(crate_img, (crate["x"] - crate_img.get_width() // 2, crate["y"] - crate_img.get_height() // 2))
 
-    # Display score, wave, and health
-    score_text = font.render(f"Points: {points}", True, white)  # Text is now white
-    wave_text = font.render(f"Wave: {wave}", True, white)  # Text is now white
-    health_text = font.render(f"Health: {player_health}", True, white)  # Text is now white
+    # Display score, wave, health and active powerups, and the game over screen
+    hud_items = [
+        (f"Points: {points}", white, (10, 10)),
+        (f"Wave: {wave}", white, (10, 50)),
+        (f"Health: {player_health}", white, (10, 90)),
+        (f"Powerups: {', '.join(active_powerups.keys())}", white, (10, 130)),
+    ]
+    if game_over:
+        hud_items.append(("Game Over!", red, (screen_width // 2 - 80, screen_height // 2 - 20)))
+        hud_items.append(("Press SPACE to restart", white, (screen_width // 2 - 120, screen_height // 2 + 20)))
+    hud.draw(screen, hud_items)
+
+# Function to find the enemy nearest the player, or None
+def nearest_enemy():
+    alive = enemies.active()
+    if not len(alive):
+        return None
+    nearest = alive[np.argmin((enemies.x[alive] - player_x) ** 2 + (enemies.y[alive] - player_y) ** 2)]
+    return enemies.x[nearest], enemies.y[nearest]
 
-    screen.blit(score_text, (10, 10))
-    screen.blit(wave_text, (10, 50))
-    screen.blit(health_text, (10, 90))
+# Game loop
+running = True
+clock = pygame.time.Clock()
+previous_player = (player_x, player_y)
 
-    # Display active powerups
-    powerup_text = font.render(f"Powerups: {', '.join(active_powerups.keys())}", True, white)  # Text is now white
-    screen.blit(powerup_text, (10, 130))
+generate_wave(wave)  # Generate the first wave
 
-    # Game over screen
-    if game_over:
-        game_over_text = font.render("Game Over!", True, red)
-        restart_text = font.render("Press SPACE to restart", True, white)  # Text is now white
-        screen.blit(game_over_text, (screen_width // 2 - 80, screen_height // 2 - 20))
-        screen.blit(restart_text, (screen_width // 2 - 120, screen_height // 2 + 20))
+if args.headless:
+    # No drawing or frame cap; every pass of the loop is one step
+    start = time.perf_counter()
+    steps = 0
+    while steps < args.steps and not game_over:
+        if steps % headless_fire_interval == 0:
+            target = nearest_enemy()
+            if target is not None:
+                fire(*target)
+        step()
+        steps += 1
+    elapsed = time.perf_counter() - start
+    print(f"{steps} steps ({steps * time_step:.0f} s of game time) in {elapsed:.2f} s, "
+          f"{steps / elapsed:.0f} steps/s: wave {wave}, {points} points, health {player_health}")
+    running = False
+
+accumulator = 0.0
+while running:
+    # Event handling
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            running = False
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            if event.button == 1:  # Left click
+                mouse_x, mouse_y = pygame.mouse.get_pos()
+                fire(mouse_x, mouse_y)
 
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_SPACE]:
-            # Reset game variables
-            points = 0
-            wave = 1
-            player_health = 100
-            enemies = []
-            bullets = []
-            game_over = False
-            crate = None
-            active_powerups = {}
-            player_speed = 3
-            bullet_speed = 10
-            generate_wave(wave)
-            crate_spawn_time = time.time() + random.randint(120, 180)
+    # Run as many steps as the time since the last frame covers, and carry the rest over
+    accumulator += min(clock.tick(max_fps) / 1000, max_frame_time)
+    while accumulator >= time_step:
+        step()
+        accumulator -= time_step
+
+    draw(accumulator / time_step)
 
     # Update display
     pygame.display.flip()
 
-    # Control frame rate
-    clock.tick(60)
-
 # Quit Pygame gun_offset
 pygame.quit()
@@ -0,0 +1,84 @@
+# Enemies and bullets stored column by column, so a frame updates them all with a few array operations.
+
+import numpy as np
+
+
+class EntityPool:
+    """Entities as parallel NumPy arrays with a free list of slots.
+
+    Entity *i* is x[i], y[i], heading (dx[i], dy[i]) as a unit vector,
+    speed[i], health[i], size[i] and kind[i] (an index into the caller's
+    type table). prev_x and prev_y hold the position before the last
+    simulation step, for drawing in between steps. Only slots with
+    alive[i] set are in use; active() gives their indices. add() takes
+    slots off the free list, doubling the arrays if it runs out, and
+    remove() just puts them back, so neither moves any other entity.
+    """
+
+    fields = ("x", "y", "prev_x", "prev_y", "dx", "dy", "speed", "health", "size", "kind")
+    # The fields add() takes as keywords
+    keyword_fields = fields[4:]
+
+    def __init__(self, capacity=256):
+        self.capacity = 0
+        self.alive = np.zeros(0, dtype=bool)
+        for name in self.fields:
+            setattr(self, name, np.zeros(0, dtype=np.int8 if name == "kind" else float))
+        self.free = []
+        self._grow(capacity)
+
+    def __len__(self):
+        return self.capacity - len(self.free)
+
+    def _grow(self, capacity):
+        extra = capacity - self.capacity
+        self.alive = np.concatenate([self.alive, np.zeros(extra, dtype=bool)])
+        for name in self.fields:
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate([column, np.zeros(extra, dtype=column.dtype)]))
+        # Popped from the end, so the lowest slots are used first
+        self.free = list(range(capacity - 1, self.capacity - 1, -1)) + self.free
+        self.capacity = capacity
+
+    def add(self, x, y, **values):
+        # Adds one entity, or several if given arrays; returns the slots used.
+        # Fields not given are zero.
+        unknown = set(values) - set(self.keyword_fields)
+        if unknown:
+            raise TypeError(f"unknown entity fields: {', '.join(sorted(unknown))}")
+        x, y = np.broadcast_arrays(np.atleast_1d(x), np.atleast_1d(y))
+        count = len(x)
+        if count > len(self.free):
+            self._grow(max(self.capacity * 2, len(self) + count))
+        slots = np.array(self.free[len(self.free) - count:], dtype=np.int64)
+        del self.free[len(self.free) - count:]
+        self.alive[slots] = True
+        self.x[slots] = self.prev_x[slots] = x
+        self.y[slots] = self.prev_y[slots] = y
+        for name in self.keyword_fields:
+            getattr(self, name)[slots] = values.get(name, 0)
+        return slots
+
+    def remove(self, slots):
+        slots = np.unique(np.asarray(slots, dtype=np.int64))
+        slots = slots[self.alive[slots]]
+        self.alive[slots] = False
+        self.free.extend(slots.tolist())
+
+    def clear(self):
+        self.alive[:] = False
+        self.free = list(range(self.capacity - 1, -1, -1))
+
+    def active(self):
+        return np.flatnonzero(self.alive)
+
+    def save_positions(self):
+        # Call before each simulation step.
+        self.prev_x[:] = self.x
+        self.prev_y[:] = self.y
+
+    def positions(self, slots, alpha):
+        # Positions of *slots* a fraction *alpha* of the way through the last step.
+        x = self.prev_x[slots] + (self.x[slots] - self.prev_x[slots]) * alpha
+        y = self.prev_y[slots] + (self.y[slots] - self.prev_y[slots]) * alpha
+        return x, y
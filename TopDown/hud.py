@@ -0,0 +1,56 @@
+# Text overlay that is only re-rendered when what it says changes.
+
+import pygame
+
+
+class Hud:
+    """Lines of text drawn as one cached surface.
+
+    draw() takes (text, color, (x, y)) items. While they are the same as
+    last time it blits the surface it made then; otherwise it lays the
+    items out on a new surface just big enough to hold them all. Rendered
+    text is memoised by (text, color), so a value going back to something
+    already shown, such as the health after a pickup, costs no rendering;
+    the memo is emptied when it reaches max_cached entries.
+    """
+
+    def __init__(self, font, max_cached=256):
+        self.font = font
+        self.max_cached = max_cached
+        self.rendered = {}
+        self.items = None
+        self.layer = None
+        self.layer_position = (0, 0)
+
+    def text(self, text, color):
+        key = (text, color)
+        surface = self.rendered.get(key)
+        if surface is None:
+            if len(self.rendered) >= self.max_cached:
+                self.rendered.clear()
+            surface = self.rendered[key] = self.font.render(text, True, color)
+        return surface
+
+    def draw(self, screen, items):
+        items = tuple(items)
+        if items != self.items:
+            self._compose(items)
+        if self.layer is not None:
+            screen.blit(self.layer, self.layer_position)
+
+    def _compose(self, items):
+        self.items = items
+        if not items:
+            self.layer = None
+            return
+        surfaces = [self.text(text, color) for text, color, _ in items]
+        rects = [surface.get_rect(topleft=position) for surface, (_, _, position) in zip(surfaces, items)]
+        bounds = rects[0].unionall(rects[1:])
+        self.layer = pygame.Surface(bounds.size, pygame.SRCALPHA)
+        # RGBA_MAX copies the text's pixels into the clear layer as they are, where a normal blit
+        # would blend the antialiased edges with the layer's transparent black
+        for surface, rect in zip(surfaces, rects):
+            self.layer.blit(surface, (rect.x - bounds.x, rect.y - bounds.y), special_flags=pygame.BLEND_RGBA_MAX)
+        # Run-length encoding lets the blit skip the see-through gaps between the lines
+        self.layer.set_alpha(255, pygame.RLEACCEL)
+        self.layer_position = bounds.topleft
@@ -0,0 +1,46 @@
+# Uniform grid for finding what is near a point without checking everything.
+
+import numpy as np
+
+# Cell keys are cell_x * KEY_STRIDE + cell_y, unique while cell_y stays within +-KEY_STRIDE / 2.
+KEY_STRIDE = 1 << 32
+
+
+def _cell_keys(x, y, cell_size):
+    return np.floor(x / cell_size).astype(np.int64) * KEY_STRIDE + np.floor(y / cell_size).astype(np.int64)
+
+
+def close_pairs(ax, ay, a_radius, bx, by, b_radius, cell_size):
+    """Index pairs (i, j) where circle i of the a arrays overlaps circle j of b.
+
+    The b circles are bucketed by grid cell with one sort, and each a circle
+    is only tested against the b circles in the 3 x 3 cells around its own,
+    so cell_size must be at least the largest a_radius + b_radius. Radii may
+    be arrays or single numbers. Pairs come out grouped by i, in order.
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    if len(ax) == 0 or len(bx) == 0:
+        return empty, empty
+    b_keys = _cell_keys(bx, by, cell_size)
+    order = np.argsort(b_keys, kind="stable")
+    b_keys = b_keys[order]
+
+    # The keys of the nine cells around each a circle, one row per circle.
+    offsets = np.array([dx * KEY_STRIDE + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+    wanted = (_cell_keys(ax, ay, cell_size)[:, None] + offsets).ravel()
+    starts = np.searchsorted(b_keys, wanted, side="left")
+    counts = np.searchsorted(b_keys, wanted, side="right") - starts
+    total = int(counts.sum())
+    if total == 0:
+        return empty, empty
+
+    # One candidate per (a circle, b circle in a neighbouring cell).
+    a_index = np.repeat(np.repeat(np.arange(len(ax)), len(offsets)), counts)
+    first = np.cumsum(counts) - counts
+    b_index = order[np.repeat(starts - first, counts) + np.arange(total)]
+
+    dx = ax[a_index] - bx[b_index]
+    dy = ay[a_index] - by[b_index]
+    reach = np.broadcast_to(a_radius, ax.shape)[a_index] + np.broadcast_to(b_radius, bx.shape)[b_index]
+    hit = dx * dx + dy * dy < reach * reach
+    return a_index[hit], b_index[hit]
@@ -0,0 +1,37 @@
+# Feeds queued enemies into the game a few at a time.
+
+from collections import deque
+
+
+class SpawnScheduler:
+    """A queue of enemy types that update() spawns at a steady rate.
+
+    Each update() calls spawn(enemy_type) for at most *rate* queued
+    enemies, and only while fewer than *budget* are alive, so a big wave
+    arrives over several steps instead of all in one, and the number on
+    screen never goes over the budget. The rest wait in the queue until
+    enemies die.
+    """
+
+    def __init__(self, spawn, budget=300, rate=2):
+        self.spawn = spawn
+        self.budget = budget
+        self.rate = rate
+        self.queue = deque()
+
+    @property
+    def pending(self):
+        return len(self.queue)
+
+    def add(self, enemy_types):
+        self.queue.extend(enemy_types)
+
+    def clear(self):
+        self.queue.clear()
+
+    def update(self, live):
+        # *live* is how many enemies are alive now; returns how many were spawned.
+        count = min(self.rate, self.budget - live, len(self.queue))
+        for _ in range(count):
+            self.spawn(self.queue.popleft())
+        return max(count, 0)
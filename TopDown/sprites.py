@@ -0,0 +1,48 @@
+# Rotated copies of sprites, made once and reused.
+
+import math
+
+import pygame
+
+
+class RotationCache:
+    """An image rotated to *steps* evenly spaced angles.
+
+    get() snaps an angle (in radians, as atan2 gives it for screen
+    coordinates, so positive turns clockwise) to the nearest step and
+    returns that rotation, making it the first time it is asked for unless
+    the cache was built with lazy=False. smooth uses rotozoom, which
+    filters the result, instead of rotate.
+    """
+
+    def __init__(self, image, steps=360, smooth=False, lazy=True):
+        self.image = image
+        self.steps = steps
+        self.smooth = smooth
+        self.rotations = [None] * steps
+        if not lazy:
+            for index in range(steps):
+                self._rotate(index)
+
+    def index(self, angle):
+        return round(angle * self.steps / (2 * math.pi)) % self.steps
+
+    def snap(self, angle):
+        # The angle get() actually draws for *angle*.
+        return self.index(angle) * 2 * math.pi / self.steps
+
+    def get(self, angle):
+        index = self.index(angle)
+        rotation = self.rotations[index]
+        if rotation is None:
+            rotation = self._rotate(index)
+        return rotation
+
+    def _rotate(self, index):
+        degrees = -360 * index / self.steps
+        if self.smooth:
+            rotation = pygame.transform.rotozoom(self.image, degrees, 1)
+        else:
+            rotation = pygame.transform.rotate(self.image, degrees)
+        self.rotations[index] = rotation
+        return rotation